@@ -0,0 +1,152 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import cv2
+import torch
+from gallery import recognize_faces
+
+IMAGE_EXTENSIONS = ('jpg', 'png', 'jpeg')
+
+
+# Stream (source, frame index, timestamp in seconds, frame) from video files and image
+# directories, keeping every stride-th frame. Skipped video frames are grabbed, not decoded.
+def iter_frames(sources, stride=1):
+    for source in sources:
+        if os.path.isdir(source):
+            files = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+            for index in range(0, len(files), stride):
+                frame = cv2.imread(os.path.join(source, files[index]))
+                if frame is not None:
+                    yield os.path.join(source, files[index]), index, None, frame
+            continue
+
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise OSError(f"Cannot open video {source}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        index = 0
+        while True:
+            if index % stride:
+                if not cap.grab():
+                    break
+            else:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield source, index, index / fps if fps > 0 else None, frame
+            index += 1
+        cap.release()
+
+
+def batched(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+# Per-process models, loaded once by init_worker
+_worker = {}
+
+
+def init_worker(threads):
+    torch.set_num_threads(threads)
+    import face_rec
+    _worker['face_rec'] = face_rec
+    _worker['detect'] = face_rec.make_face_detector()
+
+
+# Detect faces in a batch of frames, embed all of them in one forward pass, and
+# return one record per frame
+def recognize_batch(frames, threshold=0.8):
+    face_rec = _worker['face_rec']
+    detections = [_worker['detect'](frame) for _, _, _, frame in frames]
+    crops = [(frame, box) for (_, _, _, frame), faces in zip(frames, detections) for box in faces]
+    matches = iter(recognize_faces(face_rec.embed_crops(crops), face_rec.get_database(), threshold) if crops else [])
+
+    records = []
+    for (source, index, timestamp, _), faces in zip(frames, detections):
+        records.append({
+            'source': source,
+            'frame': index,
+            'timestamp': timestamp,
+            # An empty gallery matches at an infinite distance, which JSON cannot hold: write null
+            'detections': [{'box': [int(value) for value in box], 'name': name,
+                            'distance': distance if math.isfinite(distance) else None}
+                           for box, [(name, distance)] in zip(faces, matches)],
+        })
+    return records
+
+
+# Writes records as JSON lines as they arrive, or collects them into a Parquet file
+# (one row per detection, needs pandas with pyarrow) when the output ends in .parquet
+class RecordWriter:
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.rows = []
+        self.file = None if self.parquet else open(path, 'w')
+
+    def write(self, record):
+        if not self.parquet:
+            self.file.write(json.dumps(record) + '\n')
+            return
+        for detection in record['detections']:
+            x, y, w, h = detection['box']
+            self.rows.append({'source': record['source'], 'frame': record['frame'], 'timestamp': record['timestamp'],
+                              'x': x, 'y': y, 'w': w, 'h': h,
+                              'name': detection['name'], 'distance': detection['distance']})
+
+    def close(self):
+        if self.parquet:
+            import pandas
+            pandas.DataFrame(self.rows).to_parquet(self.path)
+        else:
+            self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognize faces in video files and image directories, headless.")
+    parser.add_argument('sources', nargs='+', help="Video files and/or directories of images.")
+    parser.add_argument('--output', default='detections.jsonl', help="A .jsonl or .parquet file.")
+    parser.add_argument('--stride', type=int, default=1, help="Keep every n-th frame.")
+    parser.add_argument('--batch-size', type=int, default=16, help="Frames per worker task.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threshold', type=float, default=0.8)
+    args = parser.parse_args()
+
+    # Build or refresh the embedding cache and saved gallery once here, so the workers warm-start from it
+    import face_rec
+    face_rec.get_database()
+
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    writer = RecordWriter(args.output)
+    frames = 0
+    start = time.perf_counter()
+    # Spawned, not forked, workers: forking after torch has run can deadlock its thread pools
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(args.workers, context, initializer=init_worker, initargs=(threads,)) as executor:
+        batches = batched(iter_frames(args.sources, args.stride), args.batch_size)
+        # Keep a bounded number of batches in flight so decoding never runs far ahead
+        pending = [executor.submit(recognize_batch, batch, args.threshold)
+                   for batch in islice(batches, 2 * args.workers)]
+        while pending:
+            records = pending.pop(0).result()
+            pending.extend(executor.submit(recognize_batch, batch, args.threshold) for batch in islice(batches, 1))
+            for record in records:
+                writer.write(record)
+            frames += len(records)
+            elapsed = time.perf_counter() - start
+            print(f"Processed {frames} frames, {frames / elapsed:.1f} frames/sec", end="\r", flush=True)
+    writer.close()
+    elapsed = time.perf_counter() - start
+    print(f"\nProcessed {frames} frames in {elapsed:.1f} s ({frames / max(elapsed, 1e-9):.1f} frames/sec), "
+          f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
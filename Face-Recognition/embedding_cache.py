@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import time
+import numpy as np
+
+EMBEDDING_SIZE = 512
+
+# Bumped whenever what gets cached per image changes, which invalidates older caches
+CACHE_VERSION = 2
+
+
+# SHA-1 of a file's content, read in chunks
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# On-disk store of face embeddings: one float32 (N, 512) .npy matrix, memory-mapped
+# on load, and index.json naming that matrix and mapping each image path to its mtime,
+# size, content hash, and the matrix rows of the faces found in it.
+class EmbeddingCache:
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.matrix_name = None
+        self.images = {}
+        self.matrix = np.zeros((0, EMBEDDING_SIZE), dtype=np.float32)
+        self._current = {}
+        self._dirty = False
+        self.load()
+
+    # A rejected index (old version, or rows the matrix does not have) still names its
+    # matrix in matrix_name, so the next save removes that file instead of orphaning it
+    def load(self):
+        try:
+            with open(self.index_path) as file:
+                index = json.load(file)
+            matrix_name = index['matrix']
+            matrix = np.load(os.path.join(self.directory, matrix_name), mmap_mode='r')
+        except (OSError, ValueError, KeyError, TypeError):
+            return
+        self.matrix_name = matrix_name
+        if index.get('version') != CACHE_VERSION:
+            return
+        rows = [row for entry in index['images'].values() for row in entry['rows']]
+        if matrix.ndim == 2 and matrix.shape[1] == EMBEDDING_SIZE and all(row < len(matrix) for row in rows):
+            self.images, self.matrix = index['images'], matrix
+
+    # Returns the cached (k, 512) embeddings of an image, or None if it is new or changed.
+    # A file whose mtime changed but whose content hash did not is still a hit.
+    def get(self, path):
+        entry = self.images.get(path)
+        if entry is None:
+            return None
+        stat = os.stat(path)
+        if entry['mtime_ns'] != stat.st_mtime_ns or entry['size'] != stat.st_size:
+            if entry['size'] != stat.st_size or entry['sha1'] != file_digest(path):
+                return None
+            entry = dict(entry, mtime_ns=stat.st_mtime_ns)
+            self._dirty = True
+        embeddings = self.matrix[entry['rows']]
+        self._current[path] = (entry, embeddings)
+        return embeddings
+
+    # Records freshly computed (k, 512) embeddings for an image; k may be 0 if no face was found.
+    def put(self, path, embeddings):
+        stat = os.stat(path)
+        entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': file_digest(path)}
+        self._current[path] = (entry, np.asarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_SIZE))
+        self._dirty = True
+
+    # Writes every image seen through get/put since loading, dropping images that are gone.
+    # The matrix goes to a new file and index.json is swapped in last, so a crash at any
+    # point leaves either the old cache or the new one.
+    def save(self):
+        if not self._dirty and set(self._current) == set(self.images):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        images = {}
+        blocks = []
+        row = 0
+        for path, (entry, embeddings) in self._current.items():
+            images[path] = dict(entry, rows=list(range(row, row + len(embeddings))))
+            blocks.append(np.asarray(embeddings, dtype=np.float32))
+            row += len(embeddings)
+        matrix = np.concatenate(blocks) if blocks else np.zeros((0, EMBEDDING_SIZE), dtype=np.float32)
+
+        matrix_name = f'embeddings-{os.getpid()}-{time.time_ns()}.npy'
+        np.save(os.path.join(self.directory, matrix_name), matrix)
+        index_tmp = self.index_path + '.tmp'
+        with open(index_tmp, 'w') as file:
+            json.dump({'version': CACHE_VERSION, 'matrix': matrix_name, 'images': images}, file)
+        os.replace(index_tmp, self.index_path)
+        if self.matrix_name is not None:
+            try:
+                os.remove(os.path.join(self.directory, self.matrix_name))
+            except OSError:
+                pass
+        self.matrix_name, self.images, self.matrix = matrix_name, images, matrix
+        self._dirty = False
@@ -0,0 +1,79 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from PIL import Image
+
+EMBEDDING_SIZE = 512
+
+
+# Decode one image and return its aligned face crops as a (k, 3, 160, 160) tensor (k may be 0)
+def detect_faces(mtcnn, path):
+    img = Image.open(path).convert('RGB')
+    with torch.no_grad():
+        img_cropped = mtcnn(img)
+    if img_cropped is None:
+        return torch.zeros((0, 3, 160, 160))
+    if img_cropped.ndim == 3:
+        img_cropped = img_cropped.unsqueeze(0)
+    return img_cropped
+
+
+# Enrollment pipeline: images are decoded and cropped by MTCNN in a thread pool, and the
+# crops of all faces (not just the first per image) are embedded in fixed-size batches,
+# one InceptionResnetV1 forward pass per batch.
+# Returns {path: (k, 512) float32 array} with one row per face found in the image.
+def enroll_images(paths, mtcnn, resnet, device, batch_size=32, workers=4, report_every=50):
+    results = {path: [] for path in paths}
+    pending_crops = []
+    pending_owners = []
+    faces = 0
+    start = time.perf_counter()
+
+    def flush():
+        if not pending_crops:
+            return
+        batch = torch.cat(pending_crops).to(device)
+        with torch.no_grad():
+            embeddings = resnet(batch).cpu().numpy()
+        for owner, embedding in zip(pending_owners, embeddings):
+            results[owner].append(embedding)
+        pending_crops.clear()
+        pending_owners.clear()
+
+    def report(done, final=False):
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        end = "\n" if final else "\r"
+        print(f"Enrolled {done}/{len(paths)} images, {faces} faces, {rate:.1f} images/sec", end=end, flush=True)
+
+    with ThreadPoolExecutor(workers) as executor:
+        # Keep a bounded number of images in flight so crops never pile up in memory
+        in_flight = deque()
+        remaining = iter(paths)
+        for path in remaining:
+            in_flight.append((path, executor.submit(detect_faces, mtcnn, path)))
+            if len(in_flight) >= workers * 2:
+                break
+        done = 0
+        while in_flight:
+            path, future = in_flight.popleft()
+            next_path = next(remaining, None)
+            if next_path is not None:
+                in_flight.append((next_path, executor.submit(detect_faces, mtcnn, next_path)))
+            crops = future.result()
+            faces += len(crops)
+            for crop in crops.split(1):
+                pending_crops.append(crop)
+                pending_owners.append(path)
+                if len(pending_crops) >= batch_size:
+                    flush()
+            done += 1
+            if done % report_every == 0:
+                report(done)
+        flush()
+    if paths:
+        report(len(paths), final=True)
+
+    return {path: np.array(rows, dtype=np.float32).reshape(-1, EMBEDDING_SIZE) for path, rows in results.items()}
@@ -0,0 +1,39 @@
+import cv2
+import numpy as np
+import torch
+
+FACE_SIZE = 160
+
+
+# Crops, resizes and normalizes every detected face of a BGR frame straight into one batch
+# tensor, ready for a single InceptionResnetV1 forward pass. The result matches
+# Resize((160, 160)) + ToTensor() + Normalize([0.5] * 3, [0.5] * 3) up to resampling
+# differences, without going through PIL. Buffers grow to the largest batch seen and are
+# reused between frames, so a batcher must not be shared between threads.
+class FaceBatcher:
+    def __init__(self, device='cpu', size=FACE_SIZE):
+        self.device = device
+        self.size = size
+        self.resized = np.empty((size, size, 3), dtype=np.uint8)
+        self.pixels = np.empty((0, size, size, 3), dtype=np.uint8)
+        self.batch = torch.empty((0, 3, size, size), device=device)
+
+    def _reserve(self, count):
+        if count > len(self.pixels):
+            capacity = max(count, 2 * len(self.pixels), 4)
+            self.pixels = np.empty((capacity, self.size, self.size, 3), dtype=np.uint8)
+            self.batch = torch.empty((capacity, 3, self.size, self.size), device=self.device)
+
+    def __call__(self, frame, faces):
+        return self.crops([(frame, box) for box in faces])
+
+    # Batch faces taken from any number of frames, given as (frame, (x, y, w, h)) pairs
+    def crops(self, items):
+        count = len(items)
+        self._reserve(count)
+        for i, (frame, (x, y, w, h)) in enumerate(items):
+            cv2.resize(frame[y:y+h, x:x+w], (self.size, self.size), dst=self.resized, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self.resized, cv2.COLOR_BGR2RGB, dst=self.pixels[i])
+        batch = self.batch[:count]
+        batch.copy_(torch.from_numpy(self.pixels[:count]).permute(0, 3, 1, 2))
+        return batch.mul_(1 / 127.5).sub_(1)
@@ -0,0 +1,152 @@
+import argparse
+import json
+import resource
+import subprocess
+import time
+import cv2
+import numpy as np
+import torch
+from face_batch import FaceBatcher
+from gallery import Gallery, recognize_faces
+from gallery_benchmark import synthetic_gallery
+from inference import BACKENDS, make_embedder
+from pipeline import StageTimings, latency_summary
+
+FRAME_SIZE = (640, 480)
+
+
+# BGR face patches cut from the given images around their Haar detections, with some
+# margin so the detector still finds them once pasted into a synthetic frame
+def face_patches(paths, detect, size=112):
+    patches = []
+    for file_path in paths:
+        image = cv2.imread(file_path)
+        if image is None:
+            continue
+        for x, y, w, h in detect(image):
+            margin = w // 4
+            top, left = max(0, y - margin), max(0, x - margin)
+            patch = image[top:y + h + margin, left:x + w + margin]
+            patches.append(cv2.resize(patch, (size, size), interpolation=cv2.INTER_AREA))
+    return patches
+
+
+# A noisy camera-sized frame with `count` face patches laid out on a grid, and the face boxes
+def synthetic_frame(patches, count, rng):
+    width, height = FRAME_SIZE
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (0, 0), 8)
+    columns = int(np.ceil(np.sqrt(count * width / height)))
+    rows = int(np.ceil(count / columns))
+    cell_w, cell_h = width // columns, height // rows
+    boxes = []
+    for i in range(count):
+        patch = patches[rng.integers(len(patches))]
+        size = min(len(patch), cell_w, cell_h)
+        if size != len(patch):
+            patch = cv2.resize(patch, (size, size), interpolation=cv2.INTER_AREA)
+        margin = size // 6
+        x = (i % columns) * cell_w + (cell_w - size) // 2
+        y = (i // columns) * cell_h + (cell_h - size) // 2
+        frame[y:y + size, x:x + size] = patch
+        boxes.append((x + margin, y + margin, size - 2 * margin, size - 2 * margin))
+    return frame, boxes
+
+
+# A gallery of `size` identities: the embeddings of the benchmark faces plus synthetic ones
+def make_benchmark_gallery(known, size):
+    embeddings = known[:size]
+    if size > len(known):
+        embeddings = torch.cat([embeddings, synthetic_gallery(size - len(known), 1)[0]])
+    return Gallery([f"person_{i}" for i in range(len(embeddings))], embeddings)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# Time detection, crop/transform and embedding of every (frame, boxes) pair; returns the
+# per-stage summaries, the number of faces the detector found, and the frames' embeddings
+def run_frames(frames, detect, batcher, embed):
+    timings = StageTimings()
+    detected = 0
+    embeddings = []
+    for frame, boxes in frames:
+        with timings.stage('detect'):
+            detected += len(detect(frame))
+        with timings.stage('crop'):
+            batch = batcher(frame, boxes)
+        with timings.stage('embed'):
+            embeddings.append(embed(batch).cpu())
+    return timings.summary(), detected, embeddings
+
+
+def time_matching(embeddings, gallery, repeats):
+    samples = []
+    for _ in range(repeats):
+        for frame_embeddings in embeddings:
+            start = time.perf_counter()
+            recognize_faces(frame_embeddings, gallery)
+            samples.append(time.perf_counter() - start)
+    return latency_summary(samples)
+
+
+def run(args):
+    import face_rec
+    detect = face_rec.make_face_detector()
+    patches = face_patches(face_rec.enrollment_images(args.images), detect)
+    if not patches:
+        raise SystemExit(f"No faces found in {args.images}")
+    batcher = FaceBatcher('cpu')
+    calibration = batcher.crops([(patch, (0, 0, len(patch), len(patch))) for patch in patches]).clone()
+    embed = make_embedder(face_rec.get_resnet().cpu(), args.backend, args.threads, calibration)
+    known = embed(calibration)
+
+    rng = np.random.default_rng(0)
+    report = {'backend': args.backend, 'threads': torch.get_num_threads(), 'frame_size': FRAME_SIZE,
+              'frames': args.frames, 'results': []}
+    galleries = {size: make_benchmark_gallery(known, size) for size in args.gallery_sizes}
+    for faces in args.faces:
+        frames = [synthetic_frame(patches, faces, rng) for _ in range(args.frames)]
+        run_frames(frames[:2], detect, batcher, embed)  # warm-up
+        stages, detected, embeddings = run_frames(frames, detect, batcher, embed)
+        for size, gallery in galleries.items():
+            stages = dict(stages, match=time_matching(embeddings, gallery, args.repeats))
+            total_ms = sum(stats['mean_ms'] for stats in stages.values())
+            result = {'faces_per_frame': faces, 'gallery_size': size,
+                      'detected_per_frame': detected / len(frames), 'frame_ms': total_ms,
+                      'frames_per_sec': 1000 / total_ms, 'stages': stages}
+            report['results'].append(result)
+            print(f"{faces} faces, gallery {size}: " + ", ".join(f"{stage} {stats['p50_ms']:.2f}"
+                                                              for stage, stats in stages.items())
+                  + f" ms p50, {result['frames_per_sec']:.1f} frames/sec")
+    report['peak_rss_mb'] = peak_rss_mb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage timing of detection, crop/transform, embedding and "
+                                                 "matching on synthetic frames built from local images.")
+    parser.add_argument('--images', default='Face-Recognition/images')
+    parser.add_argument('--faces', type=int, nargs='+', default=[1, 2, 4, 8], help="Faces per frame.")
+    parser.add_argument('--gallery-sizes', type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument('--frames', type=int, default=20, help="Frames per faces-per-frame setting.")
+    parser.add_argument('--repeats', type=int, default=5, help="Matching passes over the frames.")
+    parser.add_argument('--backend', default='eager', choices=BACKENDS)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--output', default='face_benchmark.json')
+    args = parser.parse_args()
+
+    report = run(args)
+    try:
+        report['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                          text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        report['commit'] = None
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Peak RSS {report['peak_rss_mb']:.0f} MB, wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
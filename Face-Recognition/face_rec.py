@@ -1,84 +1,282 @@
+import time
+_import_start = time.perf_counter()
 import cv2
-from facenet_pytorch import MTCNN, InceptionResnetV1
 import torch
-from torchvision import transforms
-from PIL import Image
 import os
+import argparse
+import json
+import threading
+import numpy as np
+from embedding_cache import EmbeddingCache
+from enrollment import enroll_images
+from face_batch import FaceBatcher
+from tracker import FaceTracker
+from gallery import compact_identities, load_gallery, make_gallery, recognize_faces
+from inference import gallery_crops, make_embedder
+from pipeline import RecognitionPipeline, StageTimings
+
+IMAGES_PATH = 'Face-Recognition/images'
+CACHE_DIR = 'Face-Recognition/.embedding_cache'
+IMAGE_EXTENSIONS = ('jpg', 'png', 'jpeg')
+
+# Seconds spent importing this module and in the first call of every lazy loader below.
+# Loaders can nest (a cold database load builds the models), so the entries can overlap.
+startup_times = {'import': time.perf_counter() - _import_start}
+
+# Nothing heavy happens at import time: models and the gallery are built by the first call
+# of their accessor, timed into startup_times, and shared by every later call
+def lazy(loader):
+    lock = threading.Lock()
+    value = []
+
+    def get():
+        if not value:
+            with lock:
+                if not value:
+                    start = time.perf_counter()
+                    value.append(loader())
+                    startup_times[loader.__name__.removeprefix('get_')] = time.perf_counter() - start
+        return value[0]
+
+    get.__name__ = loader.__name__
+    return get
 
-# Initialize MTCNN and InceptionResnetV1
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-mtcnn = MTCNN(keep_all=True, device=device)
-resnet = InceptionResnetV1(pretrained='vggface2').eval().to(device)
 
-# Transformation for face images
-transform = transforms.Compose([
-    transforms.Resize((160, 160)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.5, 0.5, 0.5], [0.5, 0.5, 0.5])
-])
+# MTCNN is only needed to enroll new or changed images
+@lazy
+def get_mtcnn():
+    from facenet_pytorch import MTCNN
+    return MTCNN(keep_all=True, device=device)
+
+@lazy
+def get_resnet():
+    from facenet_pytorch import InceptionResnetV1
+    return InceptionResnetV1(pretrained='vggface2').eval().to(device)
+
+# Crops and normalizes the faces of a frame into one reusable batch tensor
+@lazy
+def get_face_batcher():
+    return FaceBatcher(device)
+
+# Follows faces across frames so unchanged faces are not embedded again on every frame
+tracker = FaceTracker(refresh_frames=15)
+
+# Per-stage latencies of the live loop (detect, crop, embed, match, display), the same stages
+# face_benchmark.py measures offline
+timings = StageTimings()
+
+# Enrollment images and the identity each one belongs to. Images in a subfolder belong to the
+# person the subfolder is named after, and a manifest.json in the folder ({"person": ["file.jpg",
+# "subfolder/file.jpg", ...]}) assigns images to people explicitly, overriding the folders.
+# Loose images without a manifest entry map to None: each face in them is its own identity.
+# Manifest entries that are not image files on disk are skipped with a warning.
+def enrollment_images(path=IMAGES_PATH, manifest='manifest.json'):
+    identities = {}
+    for entry in sorted(os.listdir(path)):
+        entry_path = os.path.join(path, entry)
+        if os.path.isdir(entry_path):
+            for filename in sorted(os.listdir(entry_path)):
+                if filename.lower().endswith(IMAGE_EXTENSIONS):
+                    identities[os.path.join(entry_path, filename)] = entry
+        elif entry.lower().endswith(IMAGE_EXTENSIONS):
+            identities[entry_path] = None
+    manifest_path = os.path.join(path, manifest)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            for person, files in json.load(file).items():
+                for filename in files:
+                    file_path = os.path.join(path, filename)
+                    if not filename.lower().endswith(IMAGE_EXTENSIONS) or not os.path.isfile(file_path):
+                        print(f"Skipping {filename!r} for {person!r} in {manifest_path}: not an image file")
+                        continue
+                    identities[file_path] = person
+    return identities
 
 # Load and preprocess images from the folder to create a database of embeddings
-def load_face_database(path='Face-Recognition/images'):
-    database = {}
-    for filename in os.listdir(path):
-        if filename.lower().endswith(('jpg', 'png', 'jpeg')):
-            name = os.path.splitext(filename)[0]
-            img = Image.open(os.path.join(path, filename))
-            img_cropped = mtcnn(img)
-            if img_cropped is not None:
-                if img_cropped.ndim == 4:
-                    img_cropped = img_cropped[0]
-                embedding = resnet(img_cropped.unsqueeze(0).to(device))
-                database[name] = embedding.detach().cpu()[0]
-    return database
+# Embeddings are kept in an on-disk cache, so only new or changed images are embedded again
+# Images of a known person (see enrollment_images) add their largest face to that person, who is
+# stored as a centroid plus up to max_prototypes prototype embeddings. Every face of a loose
+# image is enrolled on its own, the second and later ones named "<name>#<k>".
+# index picks the gallery index ('exact' or 'ivf'); index_options go to its constructor
+# With warm_start, the gallery saved by the last load is used as is when no image is newer
+# than it and it was built with the same index, max_prototypes and index_options, which skips
+# hashing the images and never builds MTCNN or the embedding network
+def load_face_database(path=IMAGES_PATH, cache_dir=CACHE_DIR, batch_size=32, workers=4,
+                       index='exact', warm_start=False, max_prototypes=4, **index_options):
+    identities = enrollment_images(path)
+    paths = list(identities)
+    gallery_path = os.path.join(cache_dir, 'gallery.pt')
+    settings = {'max_prototypes': max_prototypes, 'index_options': index_options}
+    if warm_start and os.path.exists(gallery_path):
+        inputs = {path, os.path.join(path, 'manifest.json')} | {os.path.dirname(file_path) for file_path in paths}
+        newest = max(os.stat(file_path).st_mtime_ns for file_path in inputs | set(paths) if os.path.exists(file_path))
+        if newest <= os.stat(gallery_path).st_mtime_ns:
+            gallery = load_gallery(gallery_path)
+            if gallery.kind == index and gallery.settings == settings:
+                return gallery
+
+    cache = EmbeddingCache(cache_dir)
+    embeddings = {file_path: cache.get(file_path) for file_path in paths}
+    missing = [file_path for file_path, rows in embeddings.items() if rows is None]
+    if missing:
+        for file_path, rows in enroll_images(missing, get_mtcnn(), get_resnet(), device, batch_size, workers).items():
+            cache.put(file_path, rows)
+            embeddings[file_path] = rows
+    cache.save()
+
+    groups = {}
+    for file_path, rows in embeddings.items():
+        person = identities[file_path]
+        if person is not None:
+            groups.setdefault(person, []).extend(rows[:1])
+            continue
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        for k, row in enumerate(rows):
+            groups[name if k == 0 else f"{name}#{k}"] = [row]
+    groups = {name: np.stack(rows) for name, rows in groups.items() if rows}
+    names, matrix = compact_identities(groups, max_prototypes)
+    gallery = make_gallery(names, matrix, index, **index_options)
+    gallery.settings = settings
+    gallery.save(gallery_path)
+    return gallery
 
 # Compare face embedding to the database and find the closest match
 def recognize_face(embedding, database, threshold=0.8):
-    min_dist = float('inf')
-    name = "Unknown Person"
-    embedding = embedding.to('cpu')
-    for db_name, db_embedding in database.items():
-        dist = torch.nn.functional.pairwise_distance(embedding, db_embedding.unsqueeze(0)).min().item()
-        if dist < min_dist:
-            min_dist, name = dist, db_name
-    if min_dist > threshold:
-        return "Unknown Person", min_dist
-    return name, min_dist
-
-database = load_face_database()
+    return recognize_faces(embedding, database, threshold)[0][0]
 
-def main():
-    cap = cv2.VideoCapture(0)
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+@lazy
+def get_database():
+    return load_face_database(warm_start=True)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+# Haar cascade face detector; each pipeline worker builds its own, as cascades are not shared safely
+# With stage_timings, every call is recorded as the 'detect' stage
+def make_face_detector(stage_timings=None):
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
 
+    def detect(frame):
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4)
+        return face_cascade.detectMultiScale(gray, 1.1, 4)
+
+    if stage_timings is None:
+        return detect
+
+    def timed_detect(frame):
+        with stage_timings.stage('detect'):
+            return detect(frame)
+
+    return timed_detect
+
+# Inference backend for live embedding (see inference.py), e.g. FACE_REC_BACKEND=static_int8 on
+# CPU-only machines; all backends but eager run on the CPU. Enrollment always uses the eager
+# model, so the gallery does not depend on the backend.
+@lazy
+def get_embedder():
+    backend = os.environ.get('FACE_REC_BACKEND', 'eager')
+    threads = int(os.environ.get('FACE_REC_THREADS', 0)) or None
+    calibration = None
+    if backend == 'static_int8':
+        calibration = gallery_crops(enrollment_images(), make_face_detector(), FaceBatcher(device))
+    return make_embedder(get_resnet(), backend, threads, calibration)
+
+# The old module attributes still work, loaded on first access
+LAZY_ATTRIBUTES = {'mtcnn': get_mtcnn, 'resnet': get_resnet, 'database': get_database, 'embedder': get_embedder,
+                   'face_batcher': get_face_batcher}
+
+def __getattr__(name):
+    if name in LAZY_ATTRIBUTES:
+        return LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Embed all detected faces of a frame in one forward pass
+def embed_faces(frame, faces):
+    return embed_crops([(frame, box) for box in faces])
 
-        for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 0), 2)
+# Embed faces from any number of frames, given as (frame, box) pairs, in one forward pass
+def embed_crops(crops):
+    return get_embedder()(get_face_batcher().crops(crops)).cpu()
+
+# Embed the detected faces of a frame and match them all against the database
+# Faces are tracked across frames and only re-embedded when the tracker asks for it;
+# the others reuse the smoothed identity of their track
+def recognize_frame(frame, faces):
+    tracks = tracker.update(faces)
+    stale = [track for track in tracks if tracker.needs_embedding(track)]
+    if stale:
+        with timings.stage('crop'):
+            batch = get_face_batcher()(frame, [track.box for track in stale])
+        with timings.stage('embed'):
+            embeddings = get_embedder()(batch).cpu()
+        with timings.stage('match'):
+            matches = recognize_faces(embeddings, get_database())
+        for track, [(name, distance)] in zip(stale, matches):
+            tracker.observe(track, name, distance)
+    return [[track.identity()] for track in tracks]
+
+# Draw the latest results on the latest frame, with per-stage FPS and queue depths
+def draw_frame(frame, faces, matches, report):
+    frame = frame.copy()
+    for (x, y, w, h), [(name, distance)] in zip(faces, matches):
+        match_percentage = max(0, 100 - distance * 100)
+        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 0, 0), 2)
+        cv2.putText(frame, f"{name}: {match_percentage:.2f}%", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+    status = " ".join(f"{stage[:-4]} {value:.1f}" for stage, value in report.items() if stage.endswith('_fps'))
+    status += f" | queued {report['frames_queued']}/{report['detections_queued']}"
+    status += f" | embedded {tracker.embed_ratio():.0%}"
+    cv2.putText(frame, status, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 0), 1)
+    return frame
+
+# Build the gallery and the embedder now, rather than on the first recognized frame,
+# and return the startup breakdown in milliseconds
+def warm_up():
+    get_database()
+    get_embedder()
+    return {stage: round(seconds * 1000, 1) for stage, seconds in startup_times.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Live face recognition from the default camera.")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Load everything, print the startup breakdown as JSON and exit.")
+    parser.add_argument('--timings', metavar='PATH', help="Write the per-stage latencies to this JSON file on exit.")
+    args = parser.parse_args()
+
+    startup = warm_up()
+    if args.startup_report:
+        print(json.dumps(startup, indent=2))
+        return
+    print("Startup (ms): " + ", ".join(f"{stage} {ms}" for stage, ms in startup.items()))
+
+    cap = cv2.VideoCapture(0)
+    pipeline = RecognitionPipeline(cap, lambda: make_face_detector(timings), recognize_frame)
+    pipeline.start()
 
-            face = frame[y:y+h, x:x+w]
-            face_rgb = cv2.cvtColor(face, cv2.COLOR_BGR2RGB)
-            face_pil = Image.fromarray(face_rgb)
-            face_tensor = transform(face_pil).unsqueeze(0).to(device)
-            embedding = resnet(face_tensor)
-            name, distance = recognize_face(embedding, database)
-            match_percentage = max(0, 100 - distance * 100)
+    shown = None
+    while not pipeline.finished.is_set():
+        frame, faces, matches = pipeline.latest()
+        if frame is None or frame is shown:
+            time.sleep(0.005)
+            continue
+        shown = frame
 
-            cv2.putText(frame, f"{name}: {match_percentage:.2f}%", (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 2)
+        with timings.stage('display'):
+            cv2.imshow('Face Detection and Recognition', draw_frame(frame, faces, matches, pipeline.report()))
+        pipeline.stats['display'].tick()
 
-        cv2.imshow('Face Detection and Recognition', frame)
-        
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
-    cap.release()
-    cv2.destroyAllWindows()
+    try:
+        pipeline.stop()
+    finally:
+        summary = timings.summary()
+        for stage, stats in summary.items():
+            if stats['count']:
+                print(f"{stage}: p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms over {stats['count']} calls")
+        if args.timings:
+            with open(args.timings, 'w') as file:
+                json.dump(summary, file, indent=2)
+        cap.release()
+        cv2.destroyAllWindows()
 
 if __name__ == "__main__":
     main()
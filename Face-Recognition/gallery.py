@@ -0,0 +1,275 @@
+import math
+from collections import Counter
+import torch
+
+EMBEDDING_SIZE = 512
+UNKNOWN = "Unknown Person"
+
+
+def _as_matrix(embeddings):
+    return torch.as_tensor(embeddings, dtype=torch.float32).detach().reshape(-1, EMBEDDING_SIZE).cpu()
+
+
+# Squared L2 distances between every query and every row, given the rows' squared norms
+def _squared_distances(queries, rows, row_norms):
+    squared = torch.addmm(row_norms, queries, rows.t(), alpha=-2)
+    squared += (queries * queries).sum(dim=1, keepdim=True)
+    return squared
+
+
+# The enrolled faces as one contiguous (N, 512) float32 tensor with a parallel list of names,
+# so matching a frame is a single distance matrix instead of a Python loop per person.
+# This is the exact index: every search scans the whole gallery.
+# settings records how the gallery was built (see load_face_database) and is saved with it.
+class Gallery:
+    kind = 'exact'
+
+    def __init__(self, names, embeddings):
+        embeddings = _as_matrix(embeddings)
+        if len(names) != len(embeddings):
+            raise ValueError(f"Got {len(names)} names for {len(embeddings)} embeddings")
+        self.names = list(names)
+        self.embeddings = embeddings.contiguous()
+        self.squared_norms = (self.embeddings * self.embeddings).sum(dim=1)
+        self.settings = {}
+        self._count_rows()
+
+    # The most rows any one name has, which bounds how deep a top-k search by name must go
+    def _count_rows(self):
+        self.rows_per_name = max(Counter(self.names).values(), default=1)
+
+    # Build a gallery from the old {name: embedding} dictionary
+    @classmethod
+    def from_dict(cls, database, **options):
+        if not database:
+            return cls([], torch.zeros((0, EMBEDDING_SIZE)), **options)
+        embeddings = torch.stack([embedding.reshape(EMBEDDING_SIZE) for embedding in database.values()])
+        return cls(list(database), embeddings, **options)
+
+    def __len__(self):
+        return len(self.names)
+
+    # Append new embeddings at the end of the gallery
+    def add(self, names, embeddings):
+        embeddings = _as_matrix(embeddings)
+        if len(names) != len(embeddings):
+            raise ValueError(f"Got {len(names)} names for {len(embeddings)} embeddings")
+        self.names.extend(names)
+        self.embeddings = torch.cat([self.embeddings, embeddings])
+        self.squared_norms = torch.cat([self.squared_norms, (embeddings * embeddings).sum(dim=1)])
+        self._count_rows()
+
+    # Drop every row enrolled under one of the given names; returns the mask of rows kept
+    def remove(self, names):
+        names = set(names)
+        keep = torch.tensor([name not in names for name in self.names], dtype=torch.bool)
+        self.names = [name for name in self.names if name not in names]
+        self.embeddings = self.embeddings[keep].contiguous()
+        self.squared_norms = self.squared_norms[keep]
+        self._count_rows()
+        return keep
+
+    # L2 distances from each of M query embeddings to the k closest gallery rows
+    # Returns (M, k) distances and (M, k) row indices, closest first
+    def search(self, embeddings, k=1):
+        queries = _as_matrix(embeddings)
+        k = min(k, len(self))
+        if k == 0:
+            empty = torch.zeros((len(queries), 0))
+            return empty, empty.long()
+        # |q - g|^2 = |g|^2 - 2 q.g + |q|^2, with the gallery norms computed once up front
+        squared = _squared_distances(queries, self.embeddings, self.squared_norms)
+        squared, rows = squared.topk(k, dim=1, largest=False)
+        return squared.clamp_min(0).sqrt(), rows
+
+    def state(self):
+        return {'kind': self.kind, 'names': self.names, 'embeddings': self.embeddings, 'settings': self.settings}
+
+    def save(self, path):
+        torch.save(self.state(), path)
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['names'], state['embeddings'])
+
+
+# Plain k-means on the rows of data, returning (clusters, 512) centroids
+def kmeans(data, clusters, iterations=10, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    centroids = data[torch.randperm(len(data), generator=generator)[:clusters]].clone()
+    for _ in range(iterations):
+        assignments = nearest_centroids(data, centroids)
+        sums = torch.zeros_like(centroids).index_add_(0, assignments, data)
+        counts = torch.bincount(assignments, minlength=len(centroids))
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled].unsqueeze(1).float()
+    return centroids
+
+
+# Store each identity compactly, however many photos it was enrolled from: the normalized
+# mean of its embeddings (the centroid) plus up to max_prototypes of its embeddings, or k-means
+# prototypes of them when it has more. groups maps each name to its (n, 512) embeddings.
+# Returns the names and one contiguous matrix of rows, each name repeated on each of its rows.
+def compact_identities(groups, max_prototypes=4, seed=0):
+    names = []
+    blocks = []
+    for name, rows in groups.items():
+        rows = _as_matrix(rows)
+        if len(rows) > 1:
+            centroid = torch.nn.functional.normalize(rows.mean(dim=0, keepdim=True), dim=1)
+            if len(rows) > max_prototypes:
+                rows = torch.nn.functional.normalize(kmeans(rows, max_prototypes, seed=seed), dim=1)
+            rows = torch.cat([centroid, rows])
+        names.extend([name] * len(rows))
+        blocks.append(rows)
+    embeddings = torch.cat(blocks) if blocks else torch.zeros((0, EMBEDDING_SIZE))
+    return names, embeddings.contiguous()
+
+
+# Index of the closest centroid for every row of data, computed in chunks of rows
+def nearest_centroids(data, centroids, chunk=65536):
+    if len(data) == 0 or len(centroids) == 0:
+        return torch.zeros(len(data), dtype=torch.long)
+    norms = (centroids * centroids).sum(dim=1)
+    return torch.cat([_squared_distances(data[start:start + chunk], centroids, norms).argmin(dim=1)
+                      for start in range(0, len(data), chunk)])
+
+
+# Approximate index (IVF): the gallery is split into nlist k-means cells, and a search only
+# scans the nprobe cells whose centroids are closest to the query. nprobe is the recall/latency
+# knob: nprobe == nlist is an exact scan, small values touch a small fraction of the gallery.
+# Rows are kept sorted by cell, so each cell is one contiguous slice of the embedding matrix.
+# Added rows go to their nearest existing cell; call train() again after large changes.
+class IVFGallery(Gallery):
+    kind = 'ivf'
+
+    def __init__(self, names, embeddings, nlist=None, nprobe=8, iterations=10, seed=0, centroids=None):
+        super().__init__(names, embeddings)
+        self.fixed_nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        if centroids is None:
+            self.train()
+        else:
+            self.nlist = len(centroids)
+            self.centroids = _as_matrix(centroids)
+            self._assign_all()
+
+    # Fit the cells on (a sample of) the current gallery and reassign every row
+    # Unless nlist was given, it is 4 * sqrt(N) for the current gallery size
+    def train(self):
+        self.nlist = self.fixed_nlist or max(1, int(4 * math.sqrt(len(self))))
+        if len(self) == 0:
+            self.centroids = torch.zeros((0, EMBEDDING_SIZE))
+        else:
+            sample = self.embeddings
+            if len(sample) > 64 * self.nlist:
+                generator = torch.Generator().manual_seed(self.seed)
+                sample = sample[torch.randperm(len(sample), generator=generator)[:64 * self.nlist]]
+            self.centroids = kmeans(sample, min(self.nlist, len(sample)), self.iterations, self.seed)
+        self._assign_all()
+
+    def _assign_all(self):
+        self.assignments = nearest_centroids(self.embeddings, self.centroids)
+        self._build_lists()
+
+    # Sort the rows by cell: cell c owns rows offsets[c] to offsets[c + 1]
+    def _build_lists(self):
+        order = torch.argsort(self.assignments, stable=True)
+        self.names = [self.names[row] for row in order.tolist()]
+        self.embeddings = self.embeddings[order].contiguous()
+        self.squared_norms = self.squared_norms[order]
+        self.assignments = self.assignments[order]
+        counts = torch.bincount(self.assignments, minlength=len(self.centroids))
+        self.offsets = torch.cat([torch.zeros(1, dtype=torch.long), counts.cumsum(0)]).tolist()
+
+    def add(self, names, embeddings):
+        embeddings = _as_matrix(embeddings)
+        super().add(names, embeddings)
+        if len(self.centroids) == 0:
+            self.train()
+        else:
+            self.assignments = torch.cat([self.assignments, nearest_centroids(embeddings, self.centroids)])
+            self._build_lists()
+
+    def remove(self, names):
+        keep = super().remove(names)
+        self.assignments = self.assignments[keep]
+        self._build_lists()
+        return keep
+
+    def search(self, embeddings, k=1):
+        queries = _as_matrix(embeddings)
+        k = min(k, len(self))
+        distances = torch.full((len(queries), k), float('inf'))
+        rows = torch.full((len(queries), k), -1, dtype=torch.long)
+        if k == 0:
+            return distances, rows
+        nprobe = min(self.nprobe, len(self.centroids))
+        cells = nearest_k(queries, self.centroids, nprobe)
+        for i, query in enumerate(queries):
+            spans = [(self.offsets[cell], self.offsets[cell + 1]) for cell in cells[i].tolist()]
+            candidates = torch.cat([torch.arange(start, end) for start, end in spans])
+            if len(candidates) == 0:
+                continue
+            squared = _squared_distances(query.unsqueeze(0),
+                                         torch.cat([self.embeddings[start:end] for start, end in spans]),
+                                         torch.cat([self.squared_norms[start:end] for start, end in spans]))[0]
+            found = min(k, len(candidates))
+            squared, order = squared.topk(found, largest=False)
+            distances[i, :found] = squared.clamp_min(0).sqrt()
+            rows[i, :found] = candidates[order]
+        return distances, rows
+
+    def state(self):
+        return dict(super().state(), centroids=self.centroids, nlist=self.nlist, nprobe=self.nprobe)
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state['names'], state['embeddings'], nlist=state['nlist'], nprobe=state['nprobe'],
+                   centroids=state['centroids'])
+
+
+# Indices of the k closest centroids for every query
+def nearest_k(queries, centroids, k):
+    norms = (centroids * centroids).sum(dim=1)
+    return _squared_distances(queries, centroids, norms).topk(k, dim=1, largest=False).indices
+
+
+GALLERY_KINDS = {'exact': Gallery, 'ivf': IVFGallery}
+
+
+# Build a gallery of the given kind ('exact' or 'ivf'); options go to its constructor
+def make_gallery(names, embeddings, kind='exact', **options):
+    return GALLERY_KINDS[kind](names, embeddings, **options)
+
+
+def load_gallery(path):
+    state = torch.load(path, weights_only=True)
+    gallery = GALLERY_KINDS[state['kind']].from_state(state)
+    gallery.settings = state.get('settings', {})
+    return gallery
+
+
+# Match every face of a frame at once against the gallery
+# Returns, per face, its top-k (name, distance) pairs; matches farther than threshold are unknown.
+# An identity with several rows is only listed once, at its closest row. The search goes deep
+# enough to find k distinct names; fewer come back only when the gallery has fewer names, or
+# when several of them are beyond the threshold and all count as unknown.
+def recognize_faces(embeddings, gallery, threshold=0.8, k=1):
+    # The first (k - 1) names can take up at most (k - 1) * rows_per_name rows
+    distances, rows = gallery.search(embeddings, 1 + (k - 1) * gallery.rows_per_name)
+    results = []
+    for face_distances, face_rows in zip(distances.tolist(), rows.tolist()):
+        matches = []
+        seen = set()
+        for distance, row in zip(face_distances, face_rows):
+            name = gallery.names[row] if distance <= threshold else UNKNOWN
+            if name not in seen:
+                seen.add(name)
+                matches.append((name, distance))
+                if len(matches) == k:
+                    break
+        results.append(matches or [(UNKNOWN, float('inf'))])
+    return results
@@ -0,0 +1,71 @@
+import argparse
+import json
+import time
+import torch
+from gallery import EMBEDDING_SIZE, Gallery, IVFGallery
+
+
+# Synthetic gallery: one unit-length embedding per identity, spread around a few hundred
+# clusters as real face embeddings are, plus queries that are noisy views of random
+# enrolled identities (roughly what a new photo of a known person looks like)
+def synthetic_gallery(identities, queries, clusters=256, spread=0.7, noise=0.03, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    groups = torch.randn(clusters, EMBEDDING_SIZE, generator=generator)
+    members = torch.randint(clusters, (identities,), generator=generator)
+    centers = groups[members] + spread * torch.randn(identities, EMBEDDING_SIZE, generator=generator)
+    centers = torch.nn.functional.normalize(centers, dim=1)
+    owners = torch.randint(identities, (queries,), generator=generator)
+    probes = centers[owners] + noise * torch.randn(queries, EMBEDDING_SIZE, generator=generator)
+    return centers, torch.nn.functional.normalize(probes, dim=1)
+
+
+# Names of the k matches of every query, and the search time per query in milliseconds
+def time_search(gallery, queries, k):
+    start = time.perf_counter()
+    _, rows = gallery.search(queries, k)
+    elapsed = (time.perf_counter() - start) * 1000 / len(queries)
+    return [{gallery.names[row] for row in found if row >= 0} for found in rows.tolist()], elapsed
+
+
+# Recall@k of the approximate index against the exact scan, for every nprobe setting
+def run(identities, queries_count, k, nlist, nprobes):
+    embeddings, queries = synthetic_gallery(identities, queries_count)
+    names = [f"person_{i}" for i in range(identities)]
+
+    exact = Gallery(names, embeddings)
+    exact_names, exact_ms = time_search(exact, queries, k)
+
+    start = time.perf_counter()
+    ivf = IVFGallery(names, embeddings, nlist=nlist)
+    build_s = time.perf_counter() - start
+
+    results = {'identities': identities, 'queries': queries_count, 'k': k, 'nlist': ivf.nlist,
+               'exact_ms_per_query': exact_ms, 'ivf_build_s': build_s, 'ivf': []}
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        found_names, ms = time_search(ivf, queries, k)
+        hits = sum(len(found & expected) for found, expected in zip(found_names, exact_names))
+        results['ivf'].append({'nprobe': nprobe, 'recall': hits / (k * len(queries)), 'ms_per_query': ms})
+        print(f"{identities} identities, nprobe {nprobe}: recall@{k} {results['ivf'][-1]['recall']:.3f}, "
+              f"{ms:.3f} ms/query (exact {exact_ms:.3f} ms/query)")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of the IVF gallery index against the exact scan.")
+    parser.add_argument('--identities', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=1)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--output', default='gallery_benchmark.json')
+    args = parser.parse_args()
+
+    report = [run(identities, args.queries, args.k, args.nlist, args.nprobe) for identities in args.identities]
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
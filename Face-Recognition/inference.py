@@ -0,0 +1,143 @@
+import argparse
+import copy
+import json
+import time
+import cv2
+import torch
+from gallery import recognize_faces
+
+BACKENDS = ('eager', 'channels_last', 'torchscript', 'compile', 'dynamic_int8', 'static_int8')
+
+
+# Run the embedding network with a given CPU inference backend
+# eager:         the float32 model as is
+# channels_last: NHWC weights and inputs, which the oneDNN convolutions prefer
+# torchscript:   traced, frozen and optimized for inference (folds batch norm into convolutions)
+# compile:       torch.compile; the first calls are slow while it compiles
+# dynamic_int8:  int8 weights for the linear layers only; small change, small gain
+# static_int8:   int8 convolutions and linear layers (FX graph mode), with activation ranges
+#                calibrated on `calibration`, a (n, 3, 160, 160) batch of real face crops
+# threads sets torch's intra-op thread count for the whole process. Every backend but eager
+# runs on the CPU: they work on a CPU copy of a model that lives on the GPU, and move their
+# batches to the CPU. Eager runs wherever resnet is.
+# The returned callable maps a (n, 3, 160, 160) batch to (n, 512) embeddings.
+def make_embedder(resnet, backend='eager', threads=None, calibration=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    if calibration is not None and len(calibration) == 0:
+        raise ValueError("The calibration batch is empty: no face crops were found to calibrate on")
+    if threads:
+        torch.set_num_threads(threads)
+    model = resnet.eval()
+    on_cpu = backend != 'eager'
+    if on_cpu and next(model.parameters()).device.type != 'cpu':
+        model = copy.deepcopy(model).cpu()
+    if calibration is not None and on_cpu:
+        calibration = calibration.cpu()
+    example = calibration if calibration is not None else torch.zeros((1, 3, 160, 160))
+
+    if backend == 'channels_last':
+        model = copy.deepcopy(model).to(memory_format=torch.channels_last)
+
+        def embed(batch):
+            return model(batch.contiguous(memory_format=torch.channels_last))
+    elif backend == 'torchscript':
+        with torch.no_grad():
+            embed = torch.jit.optimize_for_inference(torch.jit.freeze(torch.jit.trace(model, example)))
+    elif backend == 'compile':
+        embed = torch.compile(model)
+    elif backend == 'dynamic_int8':
+        embed = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    elif backend == 'static_int8':
+        if calibration is None:
+            raise ValueError("The static_int8 backend needs a calibration batch of face crops")
+        from torch.ao.quantization import get_default_qconfig_mapping, quantize_fx
+        engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'qnnpack'
+        torch.backends.quantized.engine = engine
+        prepared = quantize_fx.prepare_fx(copy.deepcopy(model), get_default_qconfig_mapping(engine), (example,))
+        with torch.no_grad():
+            for chunk in calibration.split(32):
+                prepared(chunk)
+        embed = quantize_fx.convert_fx(prepared)
+    else:
+        embed = model
+
+    def run(batch):
+        with torch.no_grad():
+            return embed(batch.cpu() if on_cpu else batch)
+
+    return run
+
+
+# Compare a backend to the eager model on the same face crops: embedding drift (L2 distance),
+# how often the recognized identity changes against the (eager-enrolled) gallery, and speed.
+# Every other crop is held out for calibrating static_int8, so it is scored on faces it was
+# not calibrated on; the rest are the ones compared.
+def check_backend(resnet, backend, crops, database, threshold=0.8, threads=None, batch_size=16, repeats=3):
+    if len(crops) < 2:
+        raise ValueError("Checking a backend needs at least two face crops, one to calibrate and one to score")
+    calibration, crops = crops[1::2], crops[::2]
+    reference = make_embedder(resnet, 'eager', threads)
+    candidate = make_embedder(resnet, backend, threads, calibration=calibration)
+
+    def timed(embed):
+        outputs = [embed(chunk) for chunk in crops.split(batch_size)]  # warm-up, and compile if needed
+        start = time.perf_counter()
+        for _ in range(repeats):
+            outputs = [embed(chunk) for chunk in crops.split(batch_size)]
+        return torch.cat(outputs).cpu(), (time.perf_counter() - start) * 1000 / (repeats * len(crops))
+
+    expected, eager_ms = timed(reference)
+    found, backend_ms = timed(candidate)
+    drift = (found - expected).norm(dim=1)
+    expected_names = [match[0][0] for match in recognize_faces(expected, database, threshold)]
+    found_names = [match[0][0] for match in recognize_faces(found, database, threshold)]
+    agreement = sum(a == b for a, b in zip(expected_names, found_names)) / len(crops)
+    return {'backend': backend, 'faces': len(crops), 'calibration_faces': len(calibration),
+            'threads': torch.get_num_threads(),
+            'eager_ms_per_face': eager_ms, 'ms_per_face': backend_ms, 'speedup': eager_ms / backend_ms,
+            'mean_l2_drift': drift.mean().item(), 'max_l2_drift': drift.max().item(),
+            'identity_agreement': agreement}
+
+
+# The Haar-detected face crops of the given images (e.g. face_rec.enrollment_images()), batched
+# the way the live loop sees them
+def gallery_crops(paths, detect, batcher):
+    crops = []
+    for file_path in paths:
+        frame = cv2.imread(file_path)
+        if frame is not None:
+            crops.extend((frame, box) for box in detect(frame))
+    return batcher.crops(crops).clone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check CPU inference backends against the eager model "
+                                                 "on the enrolled gallery.")
+    parser.add_argument('--backend', nargs='+', default=list(BACKENDS[1:]), choices=BACKENDS)
+    parser.add_argument('--images', default='Face-Recognition/images')
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--threshold', type=float, default=0.8)
+    parser.add_argument('--output', default='inference_check.json')
+    args = parser.parse_args()
+
+    import face_rec
+    crops = gallery_crops(face_rec.enrollment_images(args.images), face_rec.make_face_detector(),
+                          face_rec.get_face_batcher())
+    if not len(crops):
+        raise SystemExit(f"No faces found in {args.images}")
+
+    report = []
+    for backend in args.backend:
+        result = check_backend(face_rec.get_resnet(), backend, crops, face_rec.get_database(),
+                               args.threshold, args.threads)
+        report.append(result)
+        print(f"{backend}: {result['ms_per_face']:.2f} ms/face ({result['speedup']:.2f}x eager), "
+              f"identity agreement {result['identity_agreement']:.1%}, max drift {result['max_l2_drift']:.4f}")
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import numpy as np
+
+
+# Counts items through one stage and reports its rate over the last few seconds
+class StageStats:
+    def __init__(self, window=2.0):
+        self.window = window
+        self.times = deque()
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def tick(self):
+        now = time.perf_counter()
+        with self.lock:
+            self.total += 1
+            self.times.append(now)
+            while self.times and now - self.times[0] > self.window:
+                self.times.popleft()
+
+    def fps(self):
+        with self.lock:
+            if len(self.times) < 2:
+                return 0.0
+            return (len(self.times) - 1) / (self.times[-1] - self.times[0])
+
+
+# Latency percentiles (ms) and throughput of a list of durations in seconds
+def latency_summary(seconds):
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    if not len(ms):
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'count': len(ms), 'mean_ms': float(ms.mean()), 'p50_ms': float(p50), 'p95_ms': float(p95),
+            'p99_ms': float(p99), 'max_ms': float(ms.max()), 'per_sec': float(1000 * len(ms) / ms.sum())}
+
+
+# Per-stage latency samples, recorded from any thread with `with timings.stage('detect'):`.
+# Only the last `window` samples of every stage are kept.
+class StageTimings:
+    def __init__(self, window=10000):
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self.lock:
+            self.samples[name].append(seconds)
+
+    def summary(self):
+        with self.lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+        return {name: latency_summary(values) for name, values in samples.items()}
+
+
+# Put an item on a bounded queue, dropping the oldest item instead of blocking when it is full
+def put_latest(items, item):
+    while True:
+        try:
+            items.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                items.get_nowait()
+            except queue.Empty:
+                pass
+
+
+# Capture -> detect -> recognize pipeline, one thread per stage connected by bounded queues
+# capture:   reads the camera as fast as it delivers, keeping only the newest frames
+# detect:    detect_workers threads, each with its own detector from make_detector()
+# recognize: embeds and matches the detected faces of a frame; called for every detected frame,
+#            including frames without faces, so a tracker behind it sees faces leave
+# The display loop calls latest() for the newest frame and the newest recognition results.
+class RecognitionPipeline:
+    def __init__(self, cap, make_detector, recognize, detect_workers=2, queue_size=2):
+        self.cap = cap
+        self.make_detector = make_detector
+        self.recognize = recognize
+        self.detect_workers = detect_workers
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.detections = queue.Queue(maxsize=queue_size)
+        self.stats = {stage: StageStats() for stage in ('capture', 'detect', 'recognize', 'display')}
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        self.frame = None
+        self.results = (None, [], [])
+        self.threads = []
+        self.error = None
+
+    def start(self):
+        targets = [self._capture] + [self._detect] * self.detect_workers + [self._recognize]
+        self.threads = [threading.Thread(target=self._run, args=(target,), daemon=True) for target in targets]
+        for thread in self.threads:
+            thread.start()
+
+    # A failing stage stops the whole pipeline; stop() re-raises its error in the caller's thread
+    def _run(self, target):
+        try:
+            target()
+        except Exception as error:
+            self.error = self.error or error
+            self.finished.set()
+
+    def stop(self):
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        if self.error is not None:
+            raise self.error
+
+    def _capture(self):
+        frame_id = 0
+        while not self.stopped.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                break
+            frame_id += 1
+            with self.lock:
+                self.frame = frame
+            put_latest(self.frames, (frame_id, frame))
+            self.stats['capture'].tick()
+        self.finished.set()
+
+    def _detect(self):
+        detect = self.make_detector()
+        while not self.stopped.is_set():
+            try:
+                frame_id, frame = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            put_latest(self.detections, (frame_id, frame, detect(frame)))
+            self.stats['detect'].tick()
+
+    def _recognize(self):
+        latest_id = 0
+        while not self.stopped.is_set():
+            try:
+                frame_id, frame, faces = self.detections.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            # Detection workers can finish out of order; never go back to an older frame
+            if frame_id < latest_id:
+                continue
+            latest_id = frame_id
+            matches = self.recognize(frame, faces)
+            with self.lock:
+                self.results = (frame_id, list(faces), matches)
+            self.stats['recognize'].tick()
+
+    # The newest captured frame and the newest (faces, matches) results, possibly from an earlier frame
+    def latest(self):
+        with self.lock:
+            _, faces, matches = self.results
+            return self.frame, faces, matches
+
+    def report(self):
+        report = {f"{stage}_fps": stats.fps() for stage, stats in self.stats.items()}
+        report['frames_queued'] = self.frames.qsize()
+        report['detections_queued'] = self.detections.qsize()
+        return report
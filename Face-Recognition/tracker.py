@@ -0,0 +1,99 @@
+from collections import Counter, deque
+from itertools import count
+
+
+# Intersection over union of two (x, y, w, h) boxes
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    width = min(ax + aw, bx + bw) - max(ax, bx)
+    height = min(ay + ah, by + bh) - max(ay, by)
+    if width <= 0 or height <= 0:
+        return 0.0
+    overlap = width * height
+    return overlap / (aw * ah + bw * bh - overlap)
+
+
+# One face followed across frames, with the recent identity votes from its embeddings
+class Track:
+    def __init__(self, track_id, box, vote_window):
+        self.id = track_id
+        self.box = box
+        self.missed = 0
+        self.embedded_box = None
+        self.embedded_frame = None
+        self.votes = deque(maxlen=vote_window)
+
+    # The most common name among recent votes, with its mean distance
+    def identity(self):
+        if not self.votes:
+            return None
+        name = Counter(name for name, _ in self.votes).most_common(1)[0][0]
+        distances = [distance for voted, distance in self.votes if voted == name]
+        return name, sum(distances) / len(distances)
+
+
+# IoU tracker between detection and recognition. Each detected face is matched to a track,
+# and only faces whose track is new, has moved a lot since it was last embedded (IoU with
+# that box below move_iou), or was embedded more than refresh_frames ago need a new embedding.
+# Tracks not seen for max_missed frames are dropped.
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, move_iou=0.5, refresh_frames=15, max_missed=10, vote_window=10):
+        self.iou_threshold = iou_threshold
+        self.move_iou = move_iou
+        self.refresh_frames = refresh_frames
+        self.max_missed = max_missed
+        self.vote_window = vote_window
+        self.tracks = []
+        self.frame = 0
+        self.faces_seen = 0
+        self.faces_embedded = 0
+        self._ids = count(1)
+
+    # Match this frame's boxes to tracks (greedily, best IoU first); returns one track per box
+    def update(self, faces):
+        self.frame += 1
+        faces = [tuple(int(value) for value in box) for box in faces]
+        pairs = sorted(((iou(track.box, box), t, f) for t, track in enumerate(self.tracks)
+                        for f, box in enumerate(faces)), reverse=True)
+        matched = [None] * len(faces)
+        used = set()
+        for overlap, t, f in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in used or matched[f] is not None:
+                continue
+            used.add(t)
+            matched[f] = self.tracks[t]
+
+        for t, track in enumerate(self.tracks):
+            if t not in used:
+                track.missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for f, box in enumerate(faces):
+            track = matched[f]
+            if track is None:
+                track = Track(next(self._ids), box, self.vote_window)
+                self.tracks.append(track)
+                matched[f] = track
+            track.box = box
+            track.missed = 0
+        self.faces_seen += len(faces)
+        return matched
+
+    def needs_embedding(self, track):
+        return (track.embedded_box is None
+                or self.frame - track.embedded_frame >= self.refresh_frames
+                or iou(track.box, track.embedded_box) < self.move_iou)
+
+    # Record the recognition result of a freshly embedded track
+    def observe(self, track, name, distance):
+        track.votes.append((name, distance))
+        track.embedded_box = track.box
+        track.embedded_frame = self.frame
+        self.faces_embedded += 1
+
+    # Fraction of detected faces that actually went through the embedding network
+    def embed_ratio(self):
+        return self.faces_embedded / self.faces_seen if self.faces_seen else 0.0
@@ -0,0 +1,253 @@
+import argparse
+import cProfile
+import json
+import platform
+import pstats
+import random
+import subprocess
+import time
+import tracemalloc
+
+from chatterbox import chatbot_response, find_closest_query
+from matcher import PatternIndex
+from server import percentile
+from templates import TemplateEngine
+
+WORDS = ("hello hi hey good day morning evening what can you do tell me your name age old favorite color "
+         "food hobby dream fun fact quirk bye goodbye see later thanks weather music book movie help how "
+         "are where from who made created like think about time today").split()
+
+PROFILE = {'name': 'Bench', 'birthday': '2024-01-01'}
+
+
+def synthetic_queries(patterns, patterns_per_intent=10, seed=0):
+    """
+    Generate a prompt set with the given number of patterns.
+
+    Args:
+        patterns (int): The total number of patterns.
+        patterns_per_intent (int): The number of patterns per intent.
+        seed (int): The random seed.
+
+    Returns:
+        dict: Queries in the same shape as prompts.json.
+    """
+    rng = random.Random(seed)
+    queries = {}
+    for start in range(0, patterns, patterns_per_intent):
+        count = min(patterns_per_intent, patterns - start)
+        queries[f"intent_{start // patterns_per_intent}"] = {
+            'patterns': [" ".join(rng.choices(WORDS, k=rng.randint(1, 6))) for _ in range(count)],
+            'responses': ["I am [CALCULATED_AGE] old.", "A plain reply."],
+        }
+    return queries
+
+
+def synthetic_inputs(queries, count, seed=1):
+    """
+    Generate user inputs: a third copied patterns, a third typo'd patterns, a third random words.
+
+    Args:
+        queries (dict): The prompt set to draw patterns from.
+        count (int): The number of inputs.
+        seed (int): The random seed.
+
+    Returns:
+        list: The input strings.
+    """
+    rng = random.Random(seed)
+    patterns = [pattern for data in queries.values() for pattern in data['patterns']]
+    inputs = []
+    for i in range(count):
+        if i % 3 == 0:
+            inputs.append(rng.choice(patterns))
+        elif i % 3 == 1:
+            chars = list(rng.choice(patterns))
+            position = rng.randrange(len(chars))
+            chars[position] = rng.choice("abcdefghijklmnopqrstuvwxyz")
+            inputs.append("".join(chars))
+        else:
+            inputs.append(" ".join(rng.choices(WORDS, k=rng.randint(1, 6))))
+    return inputs
+
+
+def measure(call, inputs):
+    """
+    Time a single-input call over every input.
+
+    Returns:
+        dict: Per-call p50/p99 latency in milliseconds and calls per second.
+    """
+    latencies = []
+    start = time.perf_counter()
+    for user_input in inputs:
+        call_start = time.perf_counter()
+        call(user_input)
+        latencies.append((time.perf_counter() - call_start) * 1000)
+    elapsed = time.perf_counter() - start
+    return {
+        'inputs': len(inputs),
+        'p50_ms': percentile(latencies, 0.50),
+        'p99_ms': percentile(latencies, 0.99),
+        'per_sec': len(inputs) / elapsed,
+    }
+
+
+def build(factory):
+    """
+    Build an engine while tracing memory.
+
+    Returns:
+        tuple: The engine, the build time in seconds and the peak traced memory in bytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    engine = factory()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return engine, elapsed, peak
+
+
+def match_peak(call, inputs):
+    """
+    Run a call over every input again while tracing memory.
+
+    Tracing slows every allocation down, so this is a separate pass from the
+    timed one in measure.
+
+    Returns:
+        int: The peak memory in bytes allocated while matching.
+    """
+    tracemalloc.start()
+    for user_input in inputs:
+        call(user_input)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run_size(patterns, inputs_count, engines, linear_limit):
+    """
+    Benchmark every engine on one synthetic prompt set.
+
+    Returns:
+        dict: The results for this size, keyed by engine.
+    """
+    queries = synthetic_queries(patterns)
+    inputs = synthetic_inputs(queries, inputs_count)
+    results = {'patterns': patterns, 'engines': {}}
+
+    if 'linear' in engines:
+        # The plain scan gets slow fast, so it only sees as many inputs as keep
+        # the total pattern comparisons under linear_limit.
+        sample = inputs[:max(1, min(len(inputs), linear_limit // patterns))]
+        linear = lambda text: find_closest_query(text, queries)
+        results['engines']['linear'] = dict(measure(linear, sample), match_peak_bytes=match_peak(linear, sample))
+
+    index, build_seconds, peak = build(lambda: PatternIndex(queries, cache_size=0))
+    build_stats = {'build_s': build_seconds, 'build_peak_bytes': peak}
+    if 'index' in engines:
+        results['engines']['index'] = dict(measure(index.best_match, inputs), **build_stats,
+                                           match_peak_bytes=match_peak(index.best_match, inputs))
+
+    if 'cached' in engines:
+        cached = PatternIndex(queries)
+        results['engines']['cached'] = dict(measure(cached.best_match, inputs), cache=cached.cache.info())
+        # A fresh cache, so the traced pass includes filling it
+        results['engines']['cached']['match_peak_bytes'] = match_peak(PatternIndex(queries).best_match, inputs)
+
+    if 'batch' in engines:
+        start = time.perf_counter()
+        index.best_matches(inputs)
+        elapsed = time.perf_counter() - start
+        results['engines']['batch'] = {'inputs': len(inputs), 'per_sec': len(inputs) / elapsed,
+                                       'match_peak_bytes': match_peak(index.best_matches, [inputs])}
+
+    if 'response' in engines:
+        templates = TemplateEngine(PROFILE, queries)
+        response = lambda text: chatbot_response(text, queries, PROFILE, index, templates)
+        results['engines']['response'] = dict(measure(response, inputs),
+                                              match_peak_bytes=match_peak(response, inputs))
+    return results
+
+
+def profile_hot_path(profiler, patterns, inputs_count, output):
+    """
+    Profile PatternIndex.best_match on one synthetic prompt set.
+
+    Args:
+        profiler (str): 'cprofile', or 'pyinstrument' if it is installed.
+        patterns (int): The number of patterns.
+        inputs_count (int): The number of inputs.
+        output (str): The file to write the profile to.
+    """
+    queries = synthetic_queries(patterns)
+    inputs = synthetic_inputs(queries, inputs_count)
+    index = PatternIndex(queries, cache_size=0)
+
+    if profiler == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        session = Profiler()
+        session.start()
+        for user_input in inputs:
+            index.best_match(user_input)
+        session.stop()
+        with open(output, 'w') as file:
+            file.write(session.output_text())
+        return
+
+    session = cProfile.Profile()
+    session.enable()
+    for user_input in inputs:
+        index.best_match(user_input)
+    session.disable()
+    session.dump_stats(output)
+    pstats.Stats(session).sort_stats('cumulative').print_stats(15)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chatbot matching path on synthetic prompt sets.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--inputs', type=int, default=1000)
+    parser.add_argument('--engines', nargs='+', default=['linear', 'index', 'cached', 'batch', 'response'])
+    parser.add_argument('--linear-limit', type=int, default=2000000,
+                        help="Cap on pattern comparisons for the plain linear scan per size.")
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'],
+                        help="Profile best_match on the largest size instead of benchmarking.")
+    args = parser.parse_args()
+
+    if args.profile:
+        profile_hot_path(args.profile, max(args.sizes), args.inputs, f"chatbot_{args.profile}.prof")
+        return
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'results': [],
+    }
+    for size in args.sizes:
+        result = run_size(size, args.inputs, args.engines, args.linear_limit)
+        report['results'].append(result)
+        print(f"{size} patterns: " + ", ".join(
+            f"{name} p50 {stats['p50_ms']:.3f} ms" for name, stats in result['engines'].items()
+            if 'p50_ms' in stats))
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 import json
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from fuzzywuzzy import process
 from fuzzywuzzy import fuzz
 import random
+from prompt_store import PromptStore
+from templates import calculate_age
 
 def load_json(relative_path):
     """
@@ -18,32 +18,22 @@ def load_json(relative_path):
     with open(relative_path, 'r') as file:
         return json.load(file)
 
-def calculate_age(birthdate_str):
-    """
-    Calculate the age of the chatbot in a more precise manner.
-
-    Args:
-        birthdate_str (str): The birthdate of the chatbot in 'YYYY-MM-DD' format.
-
-    Returns:
-        str: The age of the chatbot in years, months, and days.
-    """
-    birthdate = datetime.strptime(birthdate_str, "%Y-%m-%d")
-    today = datetime.now()
-    age = relativedelta(today, birthdate)
-    return f"{age.years} years, {age.months} months, and {age.days} days"
-
-def find_closest_query(user_input, queries):
+def find_closest_query(user_input, queries, index=None):
     """
     Find the closest matching query for the user's input using fuzzy string matching.
 
     Args:
         user_input (str): The user's input string.
         queries (dict): The dictionary containing queries and their patterns.
+        index (PatternIndex, optional): A prebuilt index over the queries' patterns.
+            When given, it is used instead of scoring every pattern.
 
     Returns:
         str: The key of the closest matching query, or None if no match is found.
     """
+    if index is not None:
+        return index.best_match(user_input)[0]
+
     max_score = 0
     chosen_query = None
 
@@ -57,7 +47,7 @@ def find_closest_query(user_input, queries):
 
     return chosen_query if max_score >= 50 else None  # Lower the threshold to 50 for broader matching
 
-def chatbot_response(user_input, queries, profile):
+def chatbot_response(user_input, queries, profile, index=None, templates=None):
     """
     Generate a response from the chatbot based on the user's input.
 
@@ -65,30 +55,37 @@ def chatbot_response(user_input, queries, profile):
         user_input (str): The user's input string.
         queries (dict): The dictionary containing queries and their responses.
         profile (dict): The chatbot's profile information.
+        index (PatternIndex, optional): A prebuilt index over the queries' patterns.
+        templates (TemplateEngine, optional): Renders the response's profile placeholders.
 
     Returns:
         tuple: A response from the chatbot and a flag indicating if the chat should end.
     """
-    query = find_closest_query(user_input, queries)
+    query = find_closest_query(user_input, queries, index)
     if query:
         response = random.choice(queries[query]['responses'])
-        response = response.replace("[CALCULATED_AGE]", calculate_age(profile['birthday']))
+        if templates is not None:
+            response = templates.render(response)
+        else:
+            response = response.replace("[CALCULATED_AGE]", calculate_age(profile['birthday']))
         end_chat = queries[query].get("end_chat", False)
         return response, end_chat
     else:
         return "I'm not sure how to respond to that. Can you ask something else?", False
 
 def main():
-    data = load_json('chatbot/prompts.json')
-    queries = data['queries']
-    profile = data['chatbot_profile']
+    store = PromptStore('chatbot/prompts.json')
+    store.watch()
+    profile = store.snapshot().profile
 
     print(f"Hi, I'm {profile['name']}, your friendly chatbot. I was born on {profile['birthday']}. How can I assist you today?")
 
     while True:
         user_input = input("You: ").lower()
-        response, end_chat = chatbot_response(user_input, queries, profile)
-        print(f"{profile['name']}:", response)
+        snapshot = store.snapshot()
+        response, end_chat = chatbot_response(user_input, snapshot.queries, snapshot.profile,
+                                              snapshot.index, snapshot.templates)
+        print(f"{snapshot.profile['name']}:", response)
         if end_chat:
             break
 
@@ -0,0 +1,425 @@
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from fuzzywuzzy import fuzz
+from fuzzywuzzy import utils
+
+try:
+    from rapidfuzz import fuzz as rapid_fuzz
+    from rapidfuzz import process as rapid_process
+except ImportError:
+    rapid_fuzz = rapid_process = None
+
+# Characters that survive fuzzywuzzy's full_process for ASCII input. Anything
+# else (e.g. CJK text, which force_ascii keeps) is pooled in one extra column.
+ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789_ "
+_COLUMNS = {char: column for column, char in enumerate(ALPHABET)}
+_OTHER = len(ALPHABET)
+
+# Score that the first pass of a match looks for: only patterns whose length
+# allows it are bounded first, and the rest only if nothing that good is found.
+FIRST_PASS_SCORE = 80
+
+# Upper limit on the number of cells in one input x pattern score matrix.
+BATCH_CELLS = 1 << 22
+
+# fuzzywuzzy scores with python-Levenshtein when it is installed and falls back
+# to difflib's SequenceMatcher otherwise. Only the former scores like rapidfuzz.
+LEVENSHTEIN_SCORER = fuzz.SequenceMatcher.__module__ != 'difflib'
+
+# Fewest distinct inputs worth starting a process pool for in best_matches.
+PARALLEL_MIN_INPUTS = 256
+
+# The index a best_matches pool worker scores with, see _init_worker.
+_worker_index = None
+
+
+def process_text(text):
+    """
+    Normalize a string exactly the way fuzz.token_sort_ratio does before scoring.
+
+    Args:
+        text (str): The raw pattern or user input.
+
+    Returns:
+        str: The lowercased, alphanumeric-only tokens, sorted and joined by spaces.
+    """
+    return " ".join(sorted(utils.full_process(text, force_ascii=True).split()))
+
+
+def char_counts(text):
+    """
+    Count the characters of a processed string, one column per alphabet entry.
+
+    Args:
+        text (str): A string returned by process_text.
+
+    Returns:
+        numpy.ndarray: The character histogram of the string.
+    """
+    counts = np.zeros(len(ALPHABET) + 1, dtype=np.int32)
+    for char, count in Counter(text).items():
+        counts[_COLUMNS.get(char, _OTHER)] += count
+    return counts
+
+
+class MatchCache:
+    """
+    A bounded, thread-safe LRU cache of match results keyed on processed input.
+
+    The key is the input after process_text, which is everything the score
+    depends on, so "Hi!", "hi" and "  HI " share one entry.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        Args:
+            maxsize (int): The maximum number of entries, 0 to disable caching.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        """
+        Returns:
+            dict: The hit and miss counters and the current and maximum size.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+class IntentBlock:
+    """
+    The processed patterns of one intent and their character histograms.
+    """
+
+    def __init__(self, patterns):
+        """
+        Args:
+            patterns (tuple): The intent's raw patterns.
+        """
+        self.patterns = patterns
+        self.texts = [process_text(pattern) for pattern in patterns]
+        self.lengths = np.array([len(text) for text in self.texts], dtype=np.int32)
+        self.counts = np.zeros((len(self.texts), len(ALPHABET) + 1), dtype=np.int32)
+        for row, text in enumerate(self.texts):
+            self.counts[row] = char_counts(text)
+
+
+class PatternIndex:
+    """
+    A match index over every pattern in the prompt set, built once at load time.
+
+    Each pattern is pre-tokenized and sorted, and its character histogram is
+    stored in a single matrix, with patterns ordered by length and one row per
+    character. A pattern much shorter or longer than the message cannot score
+    well, so a message first looks only at the patterns whose length allows a
+    score of FIRST_PASS_SCORE, and widens the window to the best score found
+    only when it has to. Within the window the histograms bound the
+    token_sort_ratio of every pattern in a few vectorized steps, reading only
+    the characters the message contains, and the full fuzzy score only runs on
+    the few patterns that could still win.
+    The result is identical to scanning every pattern with fuzz.token_sort_ratio.
+    Results are kept in an LRU cache that lives and dies with the index, so
+    building an index for a changed prompt set also starts a fresh cache.
+    """
+
+    def __init__(self, queries, threshold=50, cache_size=1024, blocks=None):
+        """
+        Build the index.
+
+        Args:
+            queries (dict): The dictionary containing queries and their patterns.
+            threshold (int): The minimum score a match needs to be returned.
+            cache_size (int): The number of inputs whose match is cached, 0 to disable.
+            blocks (dict, optional): Indexed intents to reuse where their patterns
+                are unchanged, as kept by a previous index (see update).
+        """
+        self.threshold = threshold
+        self.cache = MatchCache(cache_size)
+        self.reindexed = []
+        self._blocks = {}
+        for query, data in queries.items():
+            patterns = tuple(data['patterns'])
+            block = (blocks or {}).get(query)
+            if block is None or block.patterns != patterns:
+                block = IntentBlock(patterns)
+                self.reindexed.append(query)
+            self._blocks[query] = block
+
+        self._owners = [query for query, block in self._blocks.items() for _ in block.texts]
+        self._texts = [text for block in self._blocks.values() for text in block.texts]
+        lengths = np.concatenate([block.lengths for block in self._blocks.values()]
+                                 or [np.zeros(0, dtype=np.int32)])
+        counts = np.concatenate([block.counts for block in self._blocks.values()]
+                                or [np.zeros((0, len(ALPHABET) + 1), dtype=np.int32)])
+        # Patterns sorted by length, so a length window is one slice, and the
+        # histograms stored one character per row, so a message reads only its own
+        # characters. _rows maps a sorted position back to the pattern's row.
+        self._rows = np.argsort(lengths, kind='stable')
+        self._lengths = lengths[self._rows]
+        self._columns = np.ascontiguousarray(counts[self._rows].T)
+
+    def __getstate__(self):
+        # Locks cannot be pickled, so an index sent to another process starts
+        # with an empty cache of the same size
+        state = dict(self.__dict__)
+        state['cache'] = self.cache.maxsize
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cache = MatchCache(state['cache'])
+
+    def update(self, queries):
+        """
+        Build the index for a changed prompt set, re-indexing only changed intents.
+
+        The current index is left untouched, so callers still holding it keep
+        getting the old answers until they switch to the new one.
+
+        Args:
+            queries (dict): The new dictionary of queries and their patterns.
+
+        Returns:
+            PatternIndex: A new index with the same settings and an empty cache.
+        """
+        return PatternIndex(queries, self.threshold, self.cache.maxsize, self._blocks)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _length_window(self, length, score):
+        """
+        Find the patterns whose length alone does not rule out a score.
+
+        Two strings of lengths la and lb have at most min(la, lb) characters in
+        common, so no score can exceed 200 * min(la, lb) / (la + lb).
+
+        Args:
+            length (int): The length of the processed user input.
+            score (int): The score a pattern must still be able to reach.
+
+        Returns:
+            tuple: The start and end of the window in the length-sorted patterns.
+        """
+        # A bound of at least score means 200 * min / total > score - 1
+        margin = score - 1
+        if margin <= 0:
+            return 0, len(self._lengths)
+        shortest = np.floor(margin * length / (200 - margin))
+        longest = np.ceil(length * (200 - margin) / margin)
+        return (int(np.searchsorted(self._lengths, shortest, side='left')),
+                int(np.searchsorted(self._lengths, longest, side='right')))
+
+    def _upper_bounds(self, text, counts, start, end):
+        """
+        Bound the score of a slice of the length-sorted patterns against a processed input.
+
+        The number of characters two strings can have in common is at most the
+        overlap of their character histograms, which caps the matching blocks
+        any SequenceMatcher can find (this is difflib's quick_ratio).
+
+        Args:
+            text (str): The processed user input.
+            counts (numpy.ndarray): The character histogram of the input.
+            start (int): The first sorted position to bound.
+            end (int): The sorted position after the last one to bound.
+
+        Returns:
+            numpy.ndarray: An integer score per pattern that the real score cannot exceed.
+        """
+        common = np.zeros(end - start, dtype=np.int32)
+        for column in np.flatnonzero(counts).tolist():
+            common += np.minimum(self._columns[column, start:end], counts[column])
+        total = self._lengths[start:end] + len(text)
+        bounds = np.ceil(200.0 * common / np.maximum(total, 1))
+        return np.where(total == 0, 100, bounds).astype(np.int32)
+
+    def best_match(self, user_input):
+        """
+        Find the pattern with the highest token_sort_ratio for the user's input.
+
+        Ties go to the pattern that comes first in the prompt set, as with a
+        plain scan over every query and pattern.
+
+        Args:
+            user_input (str): The user's input string.
+
+        Returns:
+            tuple: The key of the closest matching query and its score, or
+            (None, 0) if no pattern reaches the threshold.
+        """
+        text = process_text(user_input)
+        result = self.cache.get(text)
+        if result is None:
+            result = self._best_match(text)
+            self.cache.put(text, result)
+        return result
+
+    def _best_match(self, text):
+        """
+        Score the processed input against the candidate patterns, best bound first.
+
+        The first pass covers the length window of FIRST_PASS_SCORE. The
+        patterns outside it are only bounded if the best score found so far
+        is lower, and then only those whose length allows that score.
+
+        Args:
+            text (str): The processed user input.
+
+        Returns:
+            tuple: The closest matching query and its score, or (None, 0).
+        """
+        counts = char_counts(text)
+        start, end = self._length_window(len(text), max(self.threshold, FIRST_PASS_SCORE))
+        best = self._scan(text, counts, [(start, end)], (0, None))
+
+        wide_start, wide_end = self._length_window(len(text), max(self.threshold, best[0]))
+        spans = [(wide_start, min(start, wide_end)), (max(end, wide_start), wide_end)]
+        best_score, best_row = self._scan(text, counts, [span for span in spans if span[0] < span[1]], best)
+
+        if best_row is None or best_score < self.threshold:
+            return None, 0
+        return self._owners[best_row], best_score
+
+    def _scan(self, text, counts, spans, best):
+        """
+        Score the patterns of some slices of the length-sorted patterns that could still win.
+
+        Ties go to the pattern that comes first in the prompt set.
+
+        Args:
+            text (str): The processed user input.
+            counts (numpy.ndarray): The character histogram of the input.
+            spans (list): (start, end) slices of the length-sorted patterns.
+            best (tuple): The best score and pattern row found so far, (0, None) if none.
+
+        Returns:
+            tuple: The best score and pattern row after these slices.
+        """
+        if not spans:
+            return best
+        bounds = np.concatenate([self._upper_bounds(text, counts, start, end) for start, end in spans])
+        rows = np.concatenate([self._rows[start:end] for start, end in spans])
+        # Bounds are whole scores, so the patterns are visited one bound at a
+        # time, best first, instead of sorting all of them
+        levels = np.bincount(bounds, minlength=101)
+
+        best_score, best_row = best
+        for bound in range(100, self.threshold - 1, -1):
+            if best_row is not None and bound < best_score:
+                break
+            if not levels[bound]:
+                continue
+            for row in np.sort(rows[bounds == bound]).tolist():
+                if best_row is not None and bound == best_score and row > best_row:
+                    break
+                score = fuzz.ratio(text, self._texts[row])
+                if score > best_score or (best_row is not None and score == best_score and row < best_row):
+                    best_score, best_row = score, row
+        return best_score, best_row
+
+    def best_matches(self, user_inputs, workers=-1):
+        """
+        Find the closest matching query for many inputs at once.
+
+        When fuzzywuzzy is backed by python-Levenshtein and rapidfuzz is
+        installed, the whole input x pattern score matrix is computed in bulk by
+        process.cdist, in chunks of rows that keep each matrix under BATCH_CELLS
+        cells, using all cores by default. rapidfuzz's ratio is the same
+        Levenshtein ratio, so the answers are those of best_match. With
+        fuzzywuzzy's difflib fallback the two scorers disagree by up to tens of
+        points, so each distinct input is matched as best_match does instead,
+        spread over a pool of worker processes that each hold a copy of the
+        index. Either way the answers are the ones the bot serves.
+
+        Args:
+            user_inputs (list): The user input strings.
+            workers (int): The number of threads for process.cdist, or of
+                processes for the difflib fallback; -1 for all cores.
+
+        Returns:
+            list: A (query, score) tuple per input, as returned by best_match.
+        """
+        if rapid_process is None or not LEVENSHTEIN_SCORER or not self._texts:
+            return self._match_distinct(user_inputs, workers)
+
+        texts = [process_text(user_input) for user_input in user_inputs]
+        rows = max(1, BATCH_CELLS // len(self._texts))
+        results = []
+        for start in range(0, len(texts), rows):
+            scores = rapid_process.cdist(texts[start:start + rows], self._texts,
+                                         scorer=rapid_fuzz.ratio, dtype=np.float64, workers=workers)
+            scores = np.round(scores).astype(np.int32)
+            best_rows = scores.argmax(axis=1)
+            best_scores = scores[np.arange(len(best_rows)), best_rows]
+            for row, score in zip(best_rows.tolist(), best_scores.tolist()):
+                if score >= self.threshold and score > 0:
+                    results.append((self._owners[row], score))
+                else:
+                    results.append((None, 0))
+        return results
+
+    def _match_distinct(self, user_inputs, workers):
+        """
+        Match each distinct processed input once, in worker processes when there are enough.
+
+        Args:
+            user_inputs (list): The user input strings.
+            workers (int): The number of worker processes, -1 for all cores.
+
+        Returns:
+            list: A (query, score) tuple per input.
+        """
+        texts = [process_text(user_input) for user_input in user_inputs]
+        distinct = list(dict.fromkeys(texts))
+        workers = os.cpu_count() if workers == -1 else workers
+        if workers <= 1 or len(distinct) < PARALLEL_MIN_INPUTS:
+            matches = [self._best_match(text) for text in distinct]
+        else:
+            size = max(1, -(-len(distinct) // (4 * workers)))
+            chunks = [distinct[start:start + size] for start in range(0, len(distinct), size)]
+            with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(self,)) as executor:
+                matches = [match for chunk in executor.map(_match_texts, chunks) for match in chunk]
+        found = dict(zip(distinct, matches))
+        return [found[text] for text in texts]
+
+
+def _init_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _match_texts(texts):
+    return [_worker_index._best_match(text) for text in texts]
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from matcher import PatternIndex
+from templates import TemplateEngine
+
+# One consistent view of the prompt set: what a request reads from start to end.
+Snapshot = namedtuple('Snapshot', ['queries', 'profile', 'index', 'templates', 'version'])
+
+
+def validate(data):
+    """
+    Check that loaded JSON has the shape of a prompt set.
+
+    Args:
+        data: The decoded contents of the prompts file.
+
+    Raises:
+        ValueError: If a part the chatbot reads is missing or of the wrong type.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("the prompts file must hold a JSON object")
+    profile = data.get('chatbot_profile')
+    if not isinstance(profile, dict):
+        raise ValueError("'chatbot_profile' must be an object")
+    for field in ('name', 'birthday'):
+        if not isinstance(profile.get(field), str):
+            raise ValueError(f"'chatbot_profile' needs a string {field!r}")
+    # Parsed as calculate_age does, so a bad date is caught here rather than on every age reply
+    datetime.strptime(profile['birthday'], "%Y-%m-%d")
+    queries = data.get('queries')
+    if not isinstance(queries, dict):
+        raise ValueError("'queries' must be an object")
+    for query, entry in queries.items():
+        if not isinstance(entry, dict):
+            raise ValueError(f"query {query!r} must be an object")
+        for field in ('patterns', 'responses'):
+            values = entry.get(field)
+            if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+                raise ValueError(f"query {query!r} needs a list of strings as {field!r}")
+
+
+class PromptStore:
+    """
+    Holds the current prompt set and swaps in a new one when the file changes.
+
+    Readers call snapshot() once per request and use only that snapshot, so a
+    reload never changes the prompts under a request that is already running.
+    A reload builds the new index next to the old one, re-indexing only the
+    intents whose patterns changed, and then replaces the snapshot in a single
+    assignment. A file that fails to load (e.g. caught mid-write) is ignored
+    and the current prompts stay in place.
+    """
+
+    def __init__(self, path, threshold=50, cache_size=1024):
+        """
+        Load the prompt set.
+
+        Args:
+            path (str): The path to the prompts JSON file.
+            threshold (int): The minimum match score, passed to PatternIndex.
+            cache_size (int): The size of the match cache, passed to PatternIndex.
+        """
+        self.path = path
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._failed_version = None
+        self._snapshot = self._load(None)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def _version(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, previous):
+        version = self._version()
+        with open(self.path, 'r') as file:
+            data = json.load(file)
+        validate(data)
+        queries = data['queries']
+        if previous is None:
+            index = PatternIndex(queries, self.threshold, self.cache_size)
+        else:
+            index = previous.index.update(queries)
+        profile = data['chatbot_profile']
+        return Snapshot(queries, profile, index, TemplateEngine(profile, queries), version)
+
+    def reload(self, force=False):
+        """
+        Reload the prompts if the file changed since the current snapshot.
+
+        Args:
+            force (bool): Reload even if the file looks unchanged.
+
+        Returns:
+            bool: True if a new snapshot was swapped in.
+        """
+        with self._reload_lock:
+            current = self._snapshot
+            version = None
+            try:
+                version = self._version()
+                if not force and version in (current.version, self._failed_version):
+                    return False
+                start = time.perf_counter()
+                snapshot = self._load(current)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as error:
+                # Reported once per broken version of the file, not on every poll
+                self._failed_version = version
+                print(f"Keeping the current prompts, could not reload {self.path}: {error}")
+                return False
+            self._snapshot = snapshot
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"Reloaded {self.path} in {elapsed:.1f} ms, "
+                  f"re-indexed {len(snapshot.index.reindexed)} of {len(snapshot.queries)} intents.")
+            return True
+
+    def watch(self, interval=1.0):
+        """
+        Start a daemon thread that checks the file every interval seconds.
+
+        Args:
+            interval (float): The polling interval in seconds.
+        """
+        if self._watcher is not None:
+            return
+
+        def poll():
+            while not self._stop.wait(interval):
+                self.reload()
+
+        self._watcher = threading.Thread(target=poll, name='prompt-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from chatterbox import chatbot_response, load_json
+from prompt_store import PromptStore
+
+# The prompt store loaded in this process (or pool worker), see load_bot.
+_bot = {}
+
+
+def load_bot(path, cache_size=1024, reload_interval=1.0):
+    """
+    Load the prompt set and build its match index for this process.
+
+    Also used as the initializer of process pool workers, so each worker
+    loads the prompts once instead of receiving them with every request.
+
+    Args:
+        path (str): The path to the prompts JSON file.
+        cache_size (int): The size of the index's match cache.
+        reload_interval (float): Seconds between checks for a changed file, 0 to never reload.
+    """
+    store = PromptStore(path, cache_size=cache_size)
+    if reload_interval > 0:
+        store.watch(reload_interval)
+    _bot['store'] = store
+
+
+def respond(message):
+    """
+    Answer one message with the current snapshot of the prompt set loaded by load_bot.
+
+    Args:
+        message (str): The user's message.
+
+    Returns:
+        tuple: A response from the chatbot and a flag indicating if the chat should end.
+    """
+    snapshot = _bot['store'].snapshot()
+    return chatbot_response(message.lower(), snapshot.queries, snapshot.profile,
+                            snapshot.index, snapshot.templates)
+
+
+def percentile(samples, fraction):
+    """
+    Pick the nearest-rank percentile from a list of samples.
+
+    Args:
+        samples (list): The samples, in any order.
+        fraction (float): The percentile as a fraction, e.g. 0.99.
+
+    Returns:
+        float: The sample at that rank, or 0.0 if there are no samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LatencyStats:
+    """
+    Per-request latencies of the most recent requests, in milliseconds.
+    """
+
+    def __init__(self, window=10000):
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+
+    def record(self, seconds):
+        self.samples.append(seconds * 1000)
+        self.requests += 1
+
+    def summary(self):
+        samples = list(self.samples)
+        return {
+            'requests': self.requests,
+            'p50_ms': percentile(samples, 0.50),
+            'p90_ms': percentile(samples, 0.90),
+            'p99_ms': percentile(samples, 0.99),
+            'max_ms': max(samples, default=0.0),
+        }
+
+
+class ChatServer:
+    """
+    An asyncio HTTP server that serves many chat sessions from one loaded prompt set.
+
+    POST /chat takes {"message": ..., "session": ...} and returns the reply;
+    a missing session starts a new one, and a reply that ends the chat closes
+    it. Sessions idle for longer than session_ttl seconds are dropped, as
+    are the least recently used ones beyond max_sessions. GET /stats returns
+    the session count, latency percentiles and, when matching runs in
+    threads, the match cache counters. Matching runs in an executor so the
+    event loop never waits on it.
+    """
+
+    def __init__(self, executor, session_ttl=1800.0, max_sessions=100000):
+        self.executor = executor
+        self.session_ttl = session_ttl
+        self.max_sessions = max_sessions
+        # session -> (messages, time of the last message), least recently used first
+        self.sessions = OrderedDict()
+        self.stats = LatencyStats()
+
+    def expire_sessions(self, now):
+        """
+        Drop the sessions idle for longer than session_ttl, then the oldest beyond max_sessions.
+
+        Args:
+            now (float): The current time.monotonic().
+        """
+        while self.sessions:
+            session, (_, last_seen) = next(iter(self.sessions.items()))
+            if now - last_seen <= self.session_ttl and len(self.sessions) <= self.max_sessions:
+                break
+            del self.sessions[session]
+
+    async def chat(self, request):
+        session = request.get('session') or uuid.uuid4().hex
+        message = request.get('message', '')
+        loop = asyncio.get_running_loop()
+        response, end_chat = await loop.run_in_executor(self.executor, respond, message)
+        now = time.monotonic()
+        if end_chat:
+            self.sessions.pop(session, None)
+        else:
+            messages = self.sessions.pop(session, (0, now))[0]
+            self.sessions[session] = (messages + 1, now)
+        self.expire_sessions(now)
+        return {'session': session, 'response': response, 'end_chat': end_chat}
+
+    async def route(self, method, path, body):
+        if method == 'POST' and path == '/chat':
+            try:
+                request = json.loads(body or b'{}')
+            except ValueError:
+                return 400, {'error': 'Request body must be JSON.'}
+            if (not isinstance(request, dict) or not isinstance(request.get('message', ''), str)
+                    or not isinstance(request.get('session'), (str, type(None)))):
+                return 400, {'error': 'Request body must be an object with a string message and session.'}
+            return 200, await self.chat(request)
+        if method == 'GET' and path == '/stats':
+            self.expire_sessions(time.monotonic())
+            stats = dict(self.stats.summary(), sessions=len(self.sessions))
+            if 'store' in _bot:
+                stats['cache'] = _bot['store'].snapshot().index.cache.info()
+            return 200, stats
+        return 404, {'error': f'No route for {method} {path}.'}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                start = time.perf_counter()
+                try:
+                    status, payload = await self.route(method, path, body)
+                except Exception as error:
+                    # Answer with an error and keep the connection, rather than drop it
+                    print(f"Error handling {method} {path}: {error!r}")
+                    status, payload = 500, {'error': 'Internal server error.'}
+                # Only answered chats count towards the latency percentiles
+                if path == '/chat' and status == 200:
+                    self.stats.record(time.perf_counter() - start)
+
+                data = json.dumps(payload).encode()
+                writer.write(f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+                             f'Content-Type: application/json\r\n'
+                             f'Content-Length: {len(data)}\r\n\r\n'.encode() + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving on http://{host}:{port} (POST /chat, GET /stats)")
+        async with server:
+            await server.serve_forever()
+
+
+async def post_chat(reader, writer, message, session=None):
+    """
+    Send one /chat request over an open keep-alive connection.
+
+    Returns:
+        dict: The decoded JSON reply.
+    """
+    body = json.dumps({'message': message, 'session': session}).encode()
+    writer.write(f'POST /chat HTTP/1.1\r\nHost: localhost\r\n'
+                 f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    length = 0
+    await reader.readline()
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return json.loads(await reader.readexactly(length))
+
+
+async def load_test(host, port, sessions, messages, corpus):
+    """
+    Run concurrent client sessions against a running server and report latencies.
+
+    Args:
+        host (str): The server host.
+        port (int): The server port.
+        sessions (int): The number of concurrent sessions.
+        messages (int): The number of messages each session sends.
+        corpus (list): The messages to pick from, in turn.
+    """
+    latencies = []
+
+    async def run_session(offset):
+        reader, writer = await asyncio.open_connection(host, port)
+        session = None
+        for i in range(messages):
+            start = time.perf_counter()
+            reply = await post_chat(reader, writer, corpus[(offset + i) % len(corpus)], session)
+            latencies.append((time.perf_counter() - start) * 1000)
+            session = None if reply['end_chat'] else reply['session']
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'requests': len(latencies),
+        'requests_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50),
+        'p90_ms': percentile(latencies, 0.90),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': max(latencies, default=0.0),
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve Chatter Box over HTTP, or load-test a running server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--prompts', default='chatbot/prompts.json')
+    parser.add_argument('--workers', type=int, default=None, help="Executor size for matching.")
+    parser.add_argument('--cache-size', type=int, default=1024, help="Match cache entries, 0 to disable.")
+    parser.add_argument('--reload-interval', type=float, default=1.0,
+                        help="Seconds between checks for a changed prompts file, 0 to never reload.")
+    parser.add_argument('--session-ttl', type=float, default=1800.0,
+                        help="Seconds a session may stay idle before it is dropped.")
+    parser.add_argument('--max-sessions', type=int, default=100000, help="Most sessions kept at once.")
+    parser.add_argument('--processes', action='store_true', help="Match in a process pool instead of threads.")
+    parser.add_argument('--load-test', action='store_true', help="Act as a client against a running server.")
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.load_test:
+        queries = load_json(args.prompts)['queries']
+        corpus = [pattern for data in queries.values() if not data.get('end_chat')
+                  for pattern in data['patterns']]
+        asyncio.run(load_test(args.host, args.port, args.sessions, args.messages, corpus))
+        return
+
+    if args.processes:
+        executor = ProcessPoolExecutor(args.workers, initializer=load_bot,
+                                       initargs=(args.prompts, args.cache_size, args.reload_interval))
+    else:
+        load_bot(args.prompts, args.cache_size, args.reload_interval)
+        executor = ThreadPoolExecutor(args.workers)
+    with executor:
+        asyncio.run(ChatServer(executor, args.session_ttl, args.max_sessions).serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import re
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+
+PLACEHOLDER = re.compile(r"\[([A-Z_]+)\]")
+
+
+def calculate_age(birthdate_str, today=None):
+    """
+    Calculate the age of the chatbot in a more precise manner.
+
+    Args:
+        birthdate_str (str): The birthdate of the chatbot in 'YYYY-MM-DD' format.
+        today (date, optional): The day to calculate the age on, today by default.
+
+    Returns:
+        str: The age of the chatbot in years, months, and days.
+    """
+    birthdate = datetime.strptime(birthdate_str, "%Y-%m-%d").date()
+    age = relativedelta(today or date.today(), birthdate)
+    return f"{age.years} years, {age.months} months, and {age.days} days"
+
+
+# Profile-driven placeholders: name -> function(profile, today) returning the text.
+PLACEHOLDERS = {
+    'CALCULATED_AGE': lambda profile, today: calculate_age(profile['birthday'], today),
+}
+
+
+def compile_template(text):
+    """
+    Split a response into literal text and placeholder names.
+
+    Bracketed names that are not in PLACEHOLDERS stay part of the literal text.
+
+    Args:
+        text (str): The response template.
+
+    Returns:
+        tuple: Literal strings and, for each placeholder, its name wrapped in a 1-tuple.
+    """
+    segments = []
+    literal = []
+    position = 0
+    for match in PLACEHOLDER.finditer(text):
+        if match.group(1) not in PLACEHOLDERS:
+            continue
+        literal.append(text[position:match.start()])
+        segments.append("".join(literal))
+        segments.append((match.group(1),))
+        literal = []
+        position = match.end()
+    literal.append(text[position:])
+    segments.append("".join(literal))
+    return tuple(segment for segment in segments if segment != "")
+
+
+class TemplateEngine:
+    """
+    Renders responses with profile placeholders filled in.
+
+    Every response is compiled into segments once, and placeholder values are
+    computed at most once per day, so rendering is a dictionary lookup and a
+    join. Responses without placeholders are returned as they are.
+    """
+
+    def __init__(self, profile, queries=None):
+        """
+        Args:
+            profile (dict): The chatbot's profile information.
+            queries (dict, optional): Queries whose responses are compiled up front.
+        """
+        self.profile = profile
+        self._compiled = {}
+        self._day = None
+        self._values = {}
+        for data in (queries or {}).values():
+            for response in data['responses']:
+                self._compile(response)
+
+    def _compile(self, response):
+        segments = self._compiled.get(response)
+        if segments is None:
+            segments = compile_template(response)
+            if all(isinstance(segment, str) for segment in segments):
+                segments = response
+            self._compiled[response] = segments
+        return segments
+
+    def _value(self, name, today):
+        if today != self._day:
+            self._day = today
+            self._values = {}
+        value = self._values.get(name)
+        if value is None:
+            value = PLACEHOLDERS[name](self.profile, today)
+            self._values[name] = value
+        return value
+
+    def render(self, response):
+        """
+        Fill in the placeholders of a response.
+
+        Args:
+            response (str): The response template.
+
+        Returns:
+            str: The response with every known placeholder replaced.
+        """
+        segments = self._compile(response)
+        if isinstance(segments, str):
+            return segments
+        today = date.today()
+        return "".join(segment if isinstance(segment, str) else self._value(segment[0], today)
+                       for segment in segments)
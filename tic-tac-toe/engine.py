@@ -0,0 +1,328 @@
+import threading
+import time
+from functools import lru_cache
+
+PLAYERS = ('X', 'O')
+
+# Scores are from the point of view of the player to move. A won game scores WIN plus the number
+# of squares left empty (so quicker wins score higher), a lost one the negative of that, a draw
+# 0. Heuristic scores of unfinished positions stay far below WIN.
+WIN = 1_000_000
+
+# Transposition table entry kinds: the stored score is exact, a lower bound or an upper bound
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def line_mask(squares):
+    return sum(1 << square for square in squares)
+
+
+# The 8 symmetries of a size x size board (4 rotations, each optionally mirrored), as
+# permutations where permutation[square] is the square that `square` moves to
+def board_symmetries(size):
+    symmetries = []
+    for mirror in (False, True):
+        for turns in range(4):
+            permutation = []
+            for square in range(size * size):
+                row, col = divmod(square, size)
+                if mirror:
+                    col = size - 1 - col
+                for _ in range(turns):
+                    row, col = col, size - 1 - row
+                permutation.append(row * size + col)
+            symmetries.append(tuple(permutation))
+    return tuple(symmetries)
+
+
+# Geometry of a size x size board where k in a row wins. Square i is row i // size, column
+# i % size, and bit 1 << i of a player's bitboard. Everything the search needs per square is
+# precomputed here once: the winning lines through it, its neighbourhood and the move order.
+class Rules:
+    def __init__(self, size=3, k=3):
+        if not 1 <= k <= size:
+            raise ValueError(f"Cannot win {k} in a row on a {size}x{size} board")
+        self.size = size
+        self.k = k
+        self.squares = size * size
+        self.full = (1 << self.squares) - 1
+
+        lines = []
+        for row in range(size):
+            for col in range(size):
+                for d_row, d_col in ((0, 1), (1, 0), (1, 1), (1, -1)):
+                    end_row, end_col = row + d_row * (k - 1), col + d_col * (k - 1)
+                    if 0 <= end_row < size and 0 <= end_col < size:
+                        lines.append(line_mask((row + d_row * i) * size + col + d_col * i for i in range(k)))
+        self.lines = tuple(lines)
+        self.lines_through = tuple(tuple(mask for mask in self.lines if mask >> square & 1)
+                                   for square in range(self.squares))
+        # A line holding count stones of one player and none of the other is worth weights[count]
+        self.weights = tuple(4 ** count if count else 0 for count in range(k + 1))
+
+        # Squares on the most winning lines first (centre, then corners on 3x3), ties broken
+        # towards the centre: strong moves first make alpha-beta cut the search earliest
+        middle = (size - 1) / 2
+        self.move_order = tuple(sorted(range(self.squares), key=lambda square: (
+            -len(self.lines_through[square]),
+            abs(square // size - middle) + abs(square % size - middle), square)))
+        # Squares at most two steps away; above 3x3 only moves near stones already played are tried
+        self.near = tuple(line_mask(other for other in range(self.squares)
+                                    if abs(other // size - square // size) <= 2
+                                    and abs(other % size - square % size) <= 2)
+                          for square in range(self.squares))
+
+        # Positions are keyed on their smallest symmetric image. The lookup tables of every
+        # bitboard under every symmetry only fit up to 3x3; bigger boards key positions as they are.
+        self.symmetries = board_symmetries(size)
+        self.inverse_symmetries = tuple(tuple(permutation.index(square) for square in range(self.squares))
+                                        for permutation in self.symmetries)
+        self.transformed = None
+        if self.squares <= 9:
+            self.transformed = tuple(
+                tuple(line_mask(permutation[square] for square in range(self.squares) if board >> square & 1)
+                      for board in range(1 << self.squares))
+                for permutation in self.symmetries)
+
+    def is_win(self, board):
+        for mask in self.lines:
+            if board & mask == mask:
+                return True
+        return False
+
+    # Incremental win check: only the lines through the square just played can have been completed
+    def wins_at(self, board, square):
+        for mask in self.lines_through[square]:
+            if board & mask == mask:
+                return True
+        return False
+
+    # Table key of a position and the symmetry that maps the position onto the keyed image
+    def canonical(self, mine, theirs):
+        if self.transformed is None:
+            return mine << self.squares | theirs, 0
+        best_key, best_symmetry = None, 0
+        for symmetry, table in enumerate(self.transformed):
+            key = table[mine] << self.squares | table[theirs]
+            if best_key is None or key < best_key:
+                best_key, best_symmetry = key, symmetry
+        return best_key, best_symmetry
+
+    # Empty squares worth searching, best first
+    def candidates(self, mine, theirs):
+        occupied = mine | theirs
+        allowed = self.full ^ occupied
+        if self.size > 3 and occupied:
+            near = 0
+            while occupied:
+                bit = occupied & -occupied
+                occupied ^= bit
+                near |= self.near[bit.bit_length() - 1]
+            allowed &= near
+        return [square for square in self.move_order if allowed >> square & 1]
+
+    # Heuristic score for the player to move: lines still open to one player only, weighted
+    # by how many of their stones are already on them
+    def evaluate(self, mine, theirs):
+        score = 0
+        weights = self.weights
+        for mask in self.lines:
+            if mine & mask:
+                if not theirs & mask:
+                    score += weights[(mine & mask).bit_count()]
+            elif theirs & mask:
+                score -= weights[(theirs & mask).bit_count()]
+        return score
+
+
+@lru_cache(maxsize=None)
+def get_rules(size=3, k=3):
+    return Rules(size, k)
+
+
+# A game position as two bitboards, one per player, with make/unmake of moves
+# X always moves first; turn is 0 when X is to move and 1 when O is
+class Position:
+    def __init__(self, size=3, k=3):
+        self.rules = get_rules(size, k)
+        self.boards = [0, 0]
+        self.turn = 0
+        self.history = []
+
+    @property
+    def size(self):
+        return self.rules.size
+
+    @property
+    def player(self):
+        return PLAYERS[self.turn]
+
+    @property
+    def occupied(self):
+        return self.boards[0] | self.boards[1]
+
+    def empty_squares(self):
+        occupied = self.occupied
+        return [square for square in range(self.rules.squares) if not occupied >> square & 1]
+
+    # 'X', 'O' or '' for the mark on a square
+    def symbol(self, square):
+        for player, board in zip(PLAYERS, self.boards):
+            if board >> square & 1:
+                return player
+        return ''
+
+    def make(self, square):
+        if self.occupied >> square & 1:
+            raise ValueError(f"Square {square} is already taken")
+        self.boards[self.turn] |= 1 << square
+        self.history.append(square)
+        self.turn ^= 1
+
+    def unmake(self):
+        square = self.history.pop()
+        self.turn ^= 1
+        self.boards[self.turn] &= ~(1 << square)
+
+    # 'X' or 'O' if that player has a line, 'Draw' if the board is full, otherwise None
+    # Only the last move can have completed a line, so only the lines through it are checked
+    def winner(self):
+        if self.history:
+            mover = self.turn ^ 1
+            if self.rules.wins_at(self.boards[mover], self.history[-1]):
+                return PLAYERS[mover]
+        if self.occupied == self.rules.full:
+            return 'Draw'
+        return None
+
+
+# Exhaustive score for the player to move, whose stones are `mine`, under perfect play from
+# both sides. Only the opponent, who just moved, can have completed a line. A plain full-width
+# search with no table, kept as the reference the engine is checked against; 3x3 only in practice.
+def negamax(mine, theirs, rules=None):
+    rules = rules or get_rules()
+    empty = rules.full ^ (mine | theirs)
+    if rules.is_win(theirs):
+        return -WIN - empty.bit_count()
+    if not empty:
+        return 0
+    best = -2 * WIN
+    while empty:
+        bit = empty & -empty
+        empty ^= bit
+        score = -negamax(theirs, mine | bit, rules)
+        if score > best:
+            best = score
+    return best
+
+
+# Raised inside the search when its time budget runs out or it is cancelled
+class SearchStopped(Exception):
+    pass
+
+
+# Iterative-deepening alpha-beta negamax with move ordering and a transposition table per
+# board variant, shared by every search. Entries are keyed on the canonical position (on 3x3
+# all 8 symmetric variants share one entry) and hold (depth, kind, score, best square in
+# canonical coordinates). Keep one Engine for a whole session: on 3x3 the first searches solve
+# the game, after which every reply is a table lookup.
+# Searches that cannot reach the end of the game score their leaves with Rules.evaluate.
+# best_move can run on a worker thread; searches on the same engine take turns.
+# With a solved-position table (see solved_table.py), positions it covers are answered from
+# it without searching.
+class Engine:
+    def __init__(self, solved=None):
+        self.solved = solved
+        self.tables = {}
+        self.nodes = 0
+        self.depth = 0
+        self.lock = threading.Lock()
+        self._rules = None
+        self._table = None
+        self._deadline = None
+        self._stop = None
+
+    # The best square for the player to move, or None if the game is over. With time_budget
+    # (seconds) the search deepens one ply at a time until the budget runs out, and returns the
+    # move of the deepest search it completed. Setting the `stop` event (a threading.Event)
+    # ends the search the same way, within a few dozen nodes.
+    def best_move(self, position, time_budget=None, stop=None):
+        if position.winner() is not None:
+            return None
+        if self.solved is not None and self.solved.rules is position.rules:
+            entry = self.solved.lookup(position.boards[position.turn], position.boards[position.turn ^ 1])
+            if entry is not None:
+                return entry[0]
+        with self.lock:
+            return self._best_move(position, time_budget, stop)
+
+    def _best_move(self, position, time_budget, stop):
+        rules = position.rules
+        self._stop = stop
+        self._rules = rules
+        self._table = self.tables.setdefault((rules.size, rules.k), {})
+        # Keep a little of the budget back for unwinding the search and answering
+        self._deadline = None if time_budget is None else time.perf_counter() + 0.95 * time_budget
+        mine, theirs = position.boards[position.turn], position.boards[position.turn ^ 1]
+        last = position.history[-1] if position.history else None
+        empties = (rules.full ^ (mine | theirs)).bit_count()
+        key, symmetry = rules.canonical(mine, theirs)
+
+        move = rules.candidates(mine, theirs)[0]
+        self.depth = 0
+        for depth in range(1, empties + 1):
+            try:
+                score = self._search(mine, theirs, depth, -2 * WIN, 2 * WIN, last)
+            except SearchStopped:
+                break
+            entry_depth, _, _, canonical_move = self._table[key]
+            move = rules.inverse_symmetries[symmetry][canonical_move]
+            self.depth = depth
+            # Stop once the game is solved from here: the whole tree was searched, or a win or
+            # loss was proven within the depth searched (a deeper search cannot find a quicker one)
+            if entry_depth >= empties or (abs(score) >= WIN and empties - (abs(score) - WIN) <= depth):
+                break
+        return move
+
+    def _search(self, mine, theirs, depth, alpha, beta, last):
+        self.nodes += 1
+        if not self.nodes & 63 and ((self._stop is not None and self._stop.is_set())
+                                    or (self._deadline is not None and time.perf_counter() > self._deadline)):
+            raise SearchStopped()
+        rules = self._rules
+        empty = rules.full ^ (mine | theirs)
+        if last is not None and rules.wins_at(theirs, last):
+            return -WIN - empty.bit_count()
+        if not empty:
+            return 0
+        if depth == 0:
+            return rules.evaluate(mine, theirs)
+
+        key, symmetry = rules.canonical(mine, theirs)
+        entry = self._table.get(key)
+        moves = rules.candidates(mine, theirs)
+        if entry is not None:
+            entry_depth, kind, score, move = entry
+            if entry_depth >= depth and (kind == EXACT or (kind == LOWER and score >= beta)
+                                         or (kind == UPPER and score <= alpha)):
+                return score
+            move = rules.inverse_symmetries[symmetry][move]
+            if move in moves:
+                moves.remove(move)
+                moves.insert(0, move)
+
+        original_alpha = alpha
+        best, best_square = -2 * WIN, moves[0]
+        for square in moves:
+            score = -self._search(theirs, mine | 1 << square, depth - 1, -beta, -alpha, square)
+            if score > best:
+                best, best_square = score, square
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        kind = UPPER if best <= original_alpha else LOWER if best >= beta else EXACT
+        # A search as deep as the empty squares reached the end of every line of play
+        self._table[key] = (depth if depth < empty.bit_count() else rules.squares, kind, best,
+                            rules.symmetries[symmetry][best_square])
+        return best
@@ -0,0 +1,130 @@
+import random
+import time
+from engine import PLAYERS, Engine, Position
+
+
+# A game without any GUI: a Position plus the moves played so far
+class Game:
+    def __init__(self, size=3, k=3):
+        self.position = Position(size, k)
+
+    @property
+    def player(self):
+        return self.position.player
+
+    @property
+    def result(self):
+        return self.position.winner()
+
+    def legal_moves(self):
+        return self.position.empty_squares()
+
+    # Play a square for the player to move; returns 'X', 'O', 'Draw' or None while in play
+    def play(self, square):
+        if self.result is not None:
+            raise ValueError("The game is over")
+        self.position.make(square)
+        return self.result
+
+
+# Players are callables mapping a Position to the square they play. They also count the
+# nodes they searched, for the self-play statistics.
+
+class EnginePlayer:
+    name = 'engine'
+
+    # engine is shared by every game this player plays, so its tables stay warm
+    def __init__(self, engine=None, time_budget=None):
+        self.engine = engine or Engine()
+        self.time_budget = time_budget
+        self.nodes = 0
+
+    def __call__(self, position):
+        before = self.engine.nodes
+        square = self.engine.best_move(position, self.time_budget)
+        self.nodes += self.engine.nodes - before
+        return square
+
+
+# The original GUI minimax, kept as the baseline: a plain full-width search on a list of
+# cell strings, scoring every line on every node, with no pruning or memoization. 3x3 only.
+class MinimaxPlayer:
+    name = 'minimax'
+    LINES = ((0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6))
+
+    def __init__(self):
+        self.nodes = 0
+
+    def __call__(self, position):
+        if position.size != 3 or position.rules.k != 3:
+            raise ValueError("The minimax baseline only plays 3x3")
+        cells = [position.symbol(square) for square in range(9)]
+        me = position.player
+        best_score, move = float('-inf'), None
+        for square in range(9):
+            if cells[square] == "":
+                cells[square] = me
+                score = self.minimax(cells, me, False)
+                cells[square] = ""
+                if score > best_score:
+                    best_score, move = score, square
+        return move
+
+    def minimax(self, cells, me, is_maximizing):
+        self.nodes += 1
+        winner = self.winner(cells)
+        if winner is not None:
+            return 0 if winner == 'Draw' else 1 if winner == me else -1
+        mark = me if is_maximizing else PLAYERS[PLAYERS.index(me) ^ 1]
+        scores = []
+        for square in range(9):
+            if cells[square] == "":
+                cells[square] = mark
+                scores.append(self.minimax(cells, me, not is_maximizing))
+                cells[square] = ""
+        return max(scores) if is_maximizing else min(scores)
+
+    def winner(self, cells):
+        for a, b, c in self.LINES:
+            if cells[a] == cells[b] == cells[c] != "":
+                return cells[a]
+        if all(cell != "" for cell in cells):
+            return 'Draw'
+        return None
+
+
+class RandomPlayer:
+    name = 'random'
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self.nodes = 0
+
+    def __call__(self, position):
+        return self.rng.choice(position.empty_squares())
+
+
+# Play one game between two players. The first opening_moves moves are random (drawn from
+# rng), so repeated games between deterministic players do not all replay the same line.
+# Returns the result and, per move, the player, square, seconds taken and nodes searched.
+def play_game(x_player, o_player, size=3, k=3, opening_moves=0, rng=None):
+    rng = rng or random.Random()
+    game = Game(size, k)
+    players = {'X': x_player, 'O': o_player}
+    moves = []
+    while game.result is None:
+        mover = players[game.player]
+        if len(moves) < opening_moves:
+            square, seconds, nodes = rng.choice(game.legal_moves()), 0.0, 0
+            opening = True
+        else:
+            before = mover.nodes
+            start = time.perf_counter()
+            square = mover(game.position)
+            seconds = time.perf_counter() - start
+            nodes = mover.nodes - before
+            opening = False
+        moves.append({'player': game.player, 'square': square, 'seconds': seconds, 'nodes': nodes,
+                      'opening': opening})
+        game.play(square)
+    return {'result': game.result, 'moves': moves}
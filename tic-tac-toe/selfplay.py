@@ -0,0 +1,122 @@
+import argparse
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from engine import Engine
+from game import EnginePlayer, MinimaxPlayer, RandomPlayer, play_game
+from solved_table import DEFAULT_PATH, SolvedTable
+
+PLAYER_KINDS = ('engine', 'minimax', 'random')
+
+
+def make_player(kind, settings, seed):
+    if kind == 'engine':
+        solved = SolvedTable.load(settings['solved']) if settings['solved'] else None
+        return EnginePlayer(Engine(solved), settings['time_budget'])
+    if kind == 'minimax':
+        return MinimaxPlayer()
+    return RandomPlayer(seed)
+
+
+# Play a chunk of games in one worker process. The players are built once per chunk, so
+# engine tables stay warm from game to game as they would over a session.
+def play_games(match, game_ids, settings):
+    x_kind, o_kind = match
+    x_player = make_player(x_kind, settings, settings['seed'] * 2 + game_ids[0])
+    o_player = make_player(o_kind, settings, settings['seed'] * 2 + game_ids[0] + 1)
+    return [play_game(x_player, o_player, settings['size'], settings['k'], settings['opening_moves'],
+                      random.Random(settings['seed'] * 1_000_003 + game_id))
+            for game_id in game_ids]
+
+
+# Nearest-rank percentile of the samples, 0.0 if there are none
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+# Search statistics of one side over all its non-opening moves, and the results of the match
+def summarize(match, records, elapsed):
+    report = {'match': f"{match[0]} (X) vs {match[1]} (O)", 'games': len(records), 'seconds': elapsed}
+    for side, kind in zip(('X', 'O'), match):
+        moves = [move for record in records for move in record['moves']
+                 if move['player'] == side and not move['opening']]
+        nodes = sum(move['nodes'] for move in moves)
+        seconds = sum(move['seconds'] for move in moves)
+        latencies = [move['seconds'] * 1000 for move in moves]
+        report[side] = {'player': kind, 'moves': len(moves), 'nodes': nodes,
+                        'nodes_per_move': nodes / len(moves) if moves else 0.0,
+                        'nodes_per_sec': nodes / seconds if seconds else 0.0,
+                        'latency_ms': {'mean': seconds * 1000 / len(moves) if moves else 0.0,
+                                       'p50': percentile(latencies, 0.50), 'p95': percentile(latencies, 0.95),
+                                       'p99': percentile(latencies, 0.99), 'max': max(latencies, default=0.0)}}
+    results = [record['result'] for record in records]
+    report['results'] = {outcome: results.count(outcome) / len(results) for outcome in ('X', 'O', 'Draw')}
+    return report
+
+
+def run_match(executor, match, settings, games, chunks):
+    game_ids = list(range(games))
+    chunk_size = max(1, -(-games // chunks))
+    start = time.perf_counter()
+    futures = [executor.submit(play_games, match, game_ids[i:i + chunk_size], settings)
+               for i in range(0, games, chunk_size)]
+    records = [record for future in futures for record in future.result()]
+    return summarize(match, records, time.perf_counter() - start)
+
+
+def parse_match(text):
+    kinds = tuple(text.split(':'))
+    if len(kinds) != 2 or any(kind not in PLAYER_KINDS for kind in kinds):
+        raise argparse.ArgumentTypeError(f"Expected X:O with players from {', '.join(PLAYER_KINDS)}")
+    return kinds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless self-play: play many games in parallel and "
+                                                 "report engine speed and results as JSON.")
+    parser.add_argument('--match', type=parse_match, action='append',
+                        help="X:O players, e.g. engine:minimax; repeatable. "
+                             "Default: engine:engine and minimax:minimax on 3x3, engine:engine otherwise.")
+    parser.add_argument('--games', type=int, default=200, help="Games per match.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--size', type=int, default=3)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help="Seconds per engine move; needed on boards too big to search to the end.")
+    parser.add_argument('--opening-moves', type=int, default=2, help="Random moves at the start of every game.")
+    parser.add_argument('--solved', nargs='?', const=DEFAULT_PATH, default=None,
+                        help="Let the engine use the 3x3 solved-position table (default path if no value).")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='selfplay.json')
+    args = parser.parse_args()
+
+    if args.size > 3 and args.time_budget is None:
+        parser.error("--time-budget is required on boards bigger than 3x3")
+    default_matches = [('engine', 'engine'), ('minimax', 'minimax')] if args.size == 3 else [('engine', 'engine')]
+    settings = {'size': args.size, 'k': args.k, 'time_budget': args.time_budget, 'opening_moves': args.opening_moves,
+                'solved': args.solved, 'seed': args.seed}
+
+    reports = []
+    with ProcessPoolExecutor(args.workers) as executor:
+        for match in args.match or default_matches:
+            report = run_match(executor, match, settings, args.games, 4 * args.workers)
+            reports.append(report)
+            results = report['results']
+            print(f"{report['match']}: X {results['X']:.1%}, O {results['O']:.1%}, draw {results['Draw']:.1%}")
+            for side in ('X', 'O'):
+                stats = report[side]
+                print(f"  {side} {stats['player']}: {stats['nodes_per_move']:.0f} nodes/move, "
+                      f"{stats['nodes_per_sec']:.0f} nodes/sec, p50 {stats['latency_ms']['p50']:.3f} ms, "
+                      f"p99 {stats['latency_ms']['p99']:.3f} ms")
+    with open(args.output, 'w') as file:
+        json.dump({'settings': settings, 'matches': reports}, file, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
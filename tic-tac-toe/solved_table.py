@@ -0,0 +1,169 @@
+import argparse
+import mmap
+import os
+import struct
+import time
+from engine import WIN, Position, get_rules, negamax
+
+# Perfect-play table for 3x3 tic-tac-toe, built once with `python solved_table.py build`.
+# The file is a 6-byte header (magic, board size, k) followed by two bytes for each of the
+# 3**9 boards written in base 3 from the point of view of the player to move (1 = their
+# stone, 2 = the opponent's): the best square and the score. Only canonical positions
+# (see Rules.canonical) are filled in; every other slot holds NO_MOVE.
+# The score byte is signed: 1 + the squares left empty at the end of a won game, the negative
+# of that for a lost one, 0 for a draw.
+MAGIC = b'TTT\x01'
+HEADER = struct.Struct('<4sBB')
+NO_MOVE = 0xFF
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solved_3x3.bin')
+
+SIZE = 3
+SQUARES = SIZE * SIZE
+
+# Value in base 3 of the squares set in a 9-bit board, so a position's slot is
+# TERNARY[mine] + 2 * TERNARY[theirs]
+TERNARY = tuple(sum(3 ** square for square in range(SQUARES) if board >> square & 1) for board in range(1 << SQUARES))
+
+
+def encode_score(score):
+    if score == 0:
+        return 0
+    return (abs(score) - WIN + 1) * (1 if score > 0 else -1)
+
+
+def decode_score(value):
+    if value == 0:
+        return 0
+    return (WIN + abs(value) - 1) * (1 if value > 0 else -1)
+
+
+# A loaded table; data is the whole file, as bytes or a read-only mmap
+class SolvedTable:
+    def __init__(self, data):
+        magic, size, k = HEADER.unpack_from(data)
+        if magic != MAGIC or (size, k) != (SIZE, SIZE):
+            raise ValueError("Not a 3x3 solved-position table")
+        if len(data) != HEADER.size + 2 * 3 ** SQUARES:
+            raise ValueError("Truncated solved-position table")
+        self.data = data
+        self.rules = get_rules(size, k)
+
+    # Memory-maps the file, or reads it into a bytes object with use_mmap=False
+    @classmethod
+    def load(cls, path=DEFAULT_PATH, use_mmap=True):
+        with open(path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if use_mmap else file.read()
+        return cls(data)
+
+    # (best square, score) for the player to move, or None if the position is not in the table
+    def lookup(self, mine, theirs):
+        _, symmetry = self.rules.canonical(mine, theirs)
+        transformed = self.rules.transformed[symmetry]
+        offset = HEADER.size + 2 * (TERNARY[transformed[mine]] + 2 * TERNARY[transformed[theirs]])
+        move = self.data[offset]
+        if move == NO_MOVE:
+            return None
+        value = self.data[offset + 1]
+        return self.rules.inverse_symmetries[symmetry][move], decode_score(value - 256 if value > 127 else value)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+# Every position reachable from the empty board that is still in play, as (mine, theirs)
+# bitboards of the player to move and the opponent
+def reachable_positions():
+    found = set()
+    position = Position()
+
+    def walk():
+        mine, theirs = position.boards[position.turn], position.boards[position.turn ^ 1]
+        if (mine, theirs) in found or position.winner() is not None:
+            return
+        found.add((mine, theirs))
+        for square in position.empty_squares():
+            position.make(square)
+            walk()
+            position.unmake()
+
+    walk()
+    return found
+
+
+# Solve every canonical position in play and pack the table. Scores come from a memoized
+# negamax over canonical positions; ties between best squares go to the first in move order.
+def build_table():
+    rules = get_rules()
+    table = bytearray([NO_MOVE, 0]) * 3 ** SQUARES
+    scores = {}
+
+    def solve(mine, theirs):
+        key, symmetry = rules.canonical(mine, theirs)
+        if key in scores:
+            return scores[key]
+        empty = rules.full ^ (mine | theirs)
+        if rules.is_win(theirs):
+            score = -WIN - empty.bit_count()
+        elif not empty:
+            score = 0
+        else:
+            score, move = -2 * WIN, None
+            for square in rules.move_order:
+                if empty >> square & 1:
+                    value = -solve(theirs, mine | 1 << square)
+                    if value > score:
+                        score, move = value, square
+            transformed = rules.transformed[symmetry]
+            slot = TERNARY[transformed[mine]] + 2 * TERNARY[transformed[theirs]]
+            table[2 * slot] = rules.symmetries[symmetry][move]
+            table[2 * slot + 1] = encode_score(score) & 0xFF
+        scores[key] = score
+        return score
+
+    solve(0, 0)
+    return HEADER.pack(MAGIC, SIZE, SIZE) + bytes(table)
+
+
+def build(path=DEFAULT_PATH):
+    data = build_table()
+    with open(path + '.tmp', 'wb') as file:
+        file.write(data)
+    os.replace(path + '.tmp', path)
+    return data
+
+
+# Checks the table against an exhaustive, table-free negamax on every reachable position:
+# the stored score must be the position's value, and the stored move must achieve it.
+# Returns the list of positions that fail.
+def verify(table):
+    failures = []
+    for mine, theirs in sorted(reachable_positions()):
+        entry = table.lookup(mine, theirs)
+        expected = negamax(mine, theirs)
+        if entry is None or entry[1] != expected or -negamax(theirs, mine | 1 << entry[0]) != expected:
+            failures.append((mine, theirs))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or verify the 3x3 solved-position table.")
+    parser.add_argument('command', choices=('build', 'verify'))
+    parser.add_argument('--path', default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'build':
+        data = build(args.path)
+        print(f"Wrote {args.path} ({len(data)} bytes) in {time.perf_counter() - start:.2f} s")
+        return
+    table = SolvedTable.load(args.path)
+    failures = verify(table)
+    print(f"Checked {len(reachable_positions())} positions in {time.perf_counter() - start:.2f} s: "
+          f"{len(failures)} mismatches")
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
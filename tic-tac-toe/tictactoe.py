@@ -1,6 +1,24 @@
 import tkinter as tk
 import tkinter.messagebox
 import random
+import queue
+import threading
+from engine import PLAYERS, Engine, Position
+from solved_table import DEFAULT_PATH, SolvedTable
+
+# Board variants offered in the main menu: (board size, stones in a row to win)
+VARIANTS = {
+    "3x3, 3 in a row": (3, 3),
+    "5x5, 4 in a row": (5, 4),
+    "7x7, 4 in a row": (7, 4),
+    "7x7, 5 in a row": (7, 5),
+}
+
+# Seconds the AI may think per move on boards too big to search to the end (3x3 is always solved)
+AI_TIME_BUDGET = 1.0
+
+# How often (ms) the Tk loop checks for the AI's answer and animates the thinking indicator
+POLL_MS = 16
 
 class TicTacToeApp:
     def __init__(self, root):
@@ -9,11 +27,24 @@ class TicTacToeApp:
         self.root.geometry("350x500")
         self.create_main_menu()
         self.game_mode = None
+        # One engine for the whole session, so its transposition table carries across moves and games
+        # 3x3 moves come straight from the solved-position table when it has been built
+        # (python solved_table.py build); without it the engine searches
+        try:
+            solved = SolvedTable.load(DEFAULT_PATH)
+        except (OSError, ValueError):
+            solved = None
+        self.engine = Engine(solved)
+        self.thinking = False
+        self.search_stop = None
+        self.poll_job = None
 
     def create_main_menu(self):
         self.main_menu_frame = tk.Frame(self.root)
         self.main_menu_frame.pack()
         tk.Label(self.main_menu_frame, text="Tic Tac Toe", font=('Helvetica', 18)).pack(pady=10)
+        self.variant = tk.StringVar(self.main_menu_frame, value=next(iter(VARIANTS)))
+        tk.OptionMenu(self.main_menu_frame, self.variant, *VARIANTS).pack(pady=5)
         tk.Button(self.main_menu_frame, text="Player vs Player", command=self.start_pvp_game).pack()
         tk.Button(self.main_menu_frame, text="Player vs AI", command=self.start_pva_game).pack()
 
@@ -27,16 +58,23 @@ class TicTacToeApp:
 
 
     # Sets up a new game
+    # The board size and winning row length come from the variant picked in the main menu
         
     def prepare_new_game(self):
+        self.size, self.k = VARIANTS[self.variant.get()]
         self.main_menu_frame.destroy()
+        # Set in both cases, so a 3x3 game after a bigger one gets the original window back
+        if self.size > 3:
+            self.root.geometry(f"{max(350, 50 * self.size)}x{50 * self.size + 250}")
+        else:
+            self.root.geometry("350x500")
         self.game_frame = tk.Frame(self.root)
         self.game_frame.pack()
         self.current_player = "X"
         self.scoreboard = {'X': {'Wins': 0, 'Losses': 0, 'Draws': 0}, 'O': {'Wins': 0, 'Losses': 0, 'Draws': 0}}
         self.display_scoreboard()
         self.player_label = tk.Label(self.game_frame, text="Player X's Turn", font=('Helvetica', 14))
-        self.player_label.grid(row=3, column=0, columnspan=3)
+        self.player_label.grid(row=self.size, column=0, columnspan=self.size)
         self.initialize_board()
 
 
@@ -46,7 +84,7 @@ class TicTacToeApp:
         scoreboard_text = f"X - Wins: {self.scoreboard['X']['Wins']} Losses: {self.scoreboard['X']['Losses']} Draws: {self.scoreboard['X']['Draws']}\n"
         scoreboard_text += f"O - Wins: {self.scoreboard['O']['Wins']} Losses: {self.scoreboard['O']['Losses']} Draws: {self.scoreboard['O']['Draws']}"
         self.scoreboard_label = tk.Label(self.game_frame, text=scoreboard_text, font=('Helvetica', 14))
-        self.scoreboard_label.grid(row=6, column=0, columnspan=3)
+        self.scoreboard_label.grid(row=self.size + 3, column=0, columnspan=self.size)
 
 
     # Updates the scoreboard based on game result
@@ -65,29 +103,36 @@ class TicTacToeApp:
 
 
     # Initializes the game board with buttons
-    # Creating a 3x3 grid of buttons for the game
+    # Creating a size x size grid of buttons for the game, smaller buttons on bigger boards
+    # The buttons only display the engine's Position, which holds the actual game state
 
     def initialize_board(self):
-        self.buttons = [[None for _ in range(3)] for _ in range(3)]
-        for i in range(3):
-            for j in range(3):
-                button = tk.Button(self.game_frame, text="", height=3, width=6, font=('Helvetica', 20),
+        self.position = Position(self.size, self.k)
+        big = self.size > 3
+        self.buttons = [[None for _ in range(self.size)] for _ in range(self.size)]
+        for i in range(self.size):
+            for j in range(self.size):
+                button = tk.Button(self.game_frame, text="", height=1 if big else 3, width=2 if big else 6,
+                                   font=('Helvetica', 14 if big else 20),
                                    command=lambda row=i, col=j: self.on_button_click(row, col))
                 button.grid(row=i, column=j)
                 self.buttons[i][j] = button
         reset_button = tk.Button(self.game_frame, text="Reset Game", command=self.reset_board)
-        reset_button.grid(row=4, column=0, columnspan=3)
+        reset_button.grid(row=self.size + 1, column=0, columnspan=self.size)
         end_game_button = tk.Button(self.game_frame, text="End Game", command=self.end_game)
-        end_game_button.grid(row=7, column=0, columnspan=3)
+        end_game_button.grid(row=self.size + 4, column=0, columnspan=self.size)
 
 
     # Handles a button click during the game
     # Logic for player/AI moves, checking for winner or draw
+    # Clicks while the AI is thinking are ignored
 
     def on_button_click(self, row, col):
-        button = self.buttons[row][col]
-        if button["text"] == "" and not self.check_winner():
-            button["text"] = self.current_player
+        if self.thinking:
+            return
+        square = row * self.size + col
+        if self.position.symbol(square) == "" and not self.check_winner():
+            self.play(square)
             if self.check_winner():
                 winner = self.current_player  # Define winner here
                 tk.messagebox.showinfo("Tic Tac Toe", f"Player {winner} wins!")
@@ -104,35 +149,35 @@ class TicTacToeApp:
     
 
     # Checks if there is a winner
-    # Logic to check all winning conditions
+    # The engine checks the board against its precomputed winning lines
     
     def check_winner(self):
-        for i in range(3):
-            if self.buttons[i][0]["text"] == self.buttons[i][1]["text"] == self.buttons[i][2]["text"] != "":
-                return True
-            if self.buttons[0][i]["text"] == self.buttons[1][i]["text"] == self.buttons[2][i]["text"] != "":
-                return True
-        if self.buttons[0][0]["text"] == self.buttons[1][1]["text"] == self.buttons[2][2]["text"] != "":
-            return True
-        if self.buttons[0][2]["text"] == self.buttons[1][1]["text"] == self.buttons[2][0]["text"] != "":
-            return True
-        return False
+        return self.position.winner() in PLAYERS
 
 
     # Checks if the game is a draw
     # Logic to determine a draw
 
     def check_draw(self):
-        return all(self.buttons[i][j]["text"] != "" for i in range(3) for j in range(3)) and not self.check_winner()
+        return self.position.winner() == 'Draw'
+
+
+    # Plays a square for the current player in the engine and shows it on its button
+
+    def play(self, square):
+        self.position.make(square)
+        self.buttons[square // self.size][square % self.size]["text"] = self.current_player
 
 
     # Resets the game board for a new game
     # Logic to clear the board and reset player
 
     def reset_board(self):
-        for i in range(3):
-            for j in range(3):
+        self.cancel_ai_move()
+        for i in range(self.size):
+            for j in range(self.size):
                 self.buttons[i][j]["text"] = ""
+        self.position = Position(self.size, self.k)
         self.current_player = "X"
         self.player_label["text"] = "Player X's Turn"
     
@@ -147,17 +192,46 @@ class TicTacToeApp:
     # Ends the current game and returns to main menu
         
     def end_game(self):
+        self.cancel_ai_move()
         self.game_frame.destroy()
         self.create_main_menu()
 
 
     # AI makes a move in PvAI mode
-    # Logic for AI to choose the best move
-        
+    # The search runs on a worker thread so the window stays responsive; poll_ai_move picks up
+    # its answer on the Tk thread through root.after
+
     def make_ai_move(self):
-        move = self.best_move()
+        self.cancel_ai_move()
+        self.thinking = True
+        self.search_stop = threading.Event()
+        answers = queue.Queue(maxsize=1)
+        position, stop = self.position, self.search_stop
+        threading.Thread(target=lambda: answers.put(self.best_move(position, stop)), daemon=True).start()
+        self.poll_job = self.root.after(POLL_MS, self.poll_ai_move, answers, position, 0)
+
+
+    # Checks for the AI's answer, animating the thinking indicator until it arrives
+    # An answer for a position that was reset in the meantime is dropped
+
+    def poll_ai_move(self, answers, position, ticks):
+        try:
+            move = answers.get_nowait()
+        except queue.Empty:
+            self.player_label["text"] = "AI is thinking" + "." * (ticks // 20 % 4)
+            self.poll_job = self.root.after(POLL_MS, self.poll_ai_move, answers, position, ticks + 1)
+            return
+        self.poll_job = None
+        self.thinking = False
+        if position is self.position:
+            self.finish_ai_move(move)
+
+
+    # Plays the AI's chosen move and checks the result
+
+    def finish_ai_move(self, move):
         if move:
-            self.buttons[move[0]][move[1]]["text"] = "O"
+            self.play(move[0] * self.size + move[1])
             if self.check_winner():
                 tk.messagebox.showinfo("Tic Tac Toe", "AI wins!")
                 self.reset_board()
@@ -166,78 +240,29 @@ class TicTacToeApp:
                 self.reset_board()
             else:
                 self.toggle_player()
+
+
+    # Stops a running AI search, on Reset and End Game
+
+    def cancel_ai_move(self):
+        if self.poll_job is not None:
+            self.root.after_cancel(self.poll_job)
+            self.poll_job = None
+        if self.search_stop is not None:
+            self.search_stop.set()
+        self.thinking = False
     
     
     # Determines the best move for AI
-    # Implements the minimax algorithm for AI
+    # Searches the engine's bitboard position, never the buttons; 3x3 is searched to the end,
+    # bigger boards by iterative deepening within AI_TIME_BUDGET. Runs on the worker thread.
                 
-    def best_move(self):
-        best_score = float('-inf')
-        move = None
-        for i in range(3):
-            for j in range(3):
-                if self.buttons[i][j]["text"] == "":
-                    self.buttons[i][j]["text"] = "O"
-                    score = self.minimax(False)
-                    self.buttons[i][j]["text"] = ""
-                    if score > best_score:
-                        best_score = score
-                        move = (i, j)
-        return move
-
-
-    # Minimax algorithm to calculate the best move for AI
-    # Recursive function for evaluating game states
-
-    def minimax(self, is_maximizing):
-        winner = self.check_winner_minimax()
-        if winner != None:
-            return {'X': -1, 'O': 1, 'Draw': 0}[winner]
-
-        if is_maximizing:
-            best_score = float('-inf')
-            for i in range(3):
-                for j in range(3):
-                    if self.buttons[i][j]["text"] == "":
-                        self.buttons[i][j]["text"] = "O"
-                        score = self.minimax(False)
-                        self.buttons[i][j]["text"] = ""
-                        best_score = max(score, best_score)
-            return best_score
-        else:
-            best_score = float('inf')
-            for i in range(3):
-                for j in range(3):
-                    if self.buttons[i][j]["text"] == "":
-                        self.buttons[i][j]["text"] = "X"
-                        score = self.minimax(True)
-                        self.buttons[i][j]["text"] = ""
-                        best_score = min(score, best_score)
-            return best_score
-
-
-    # Checks for a winner specifically for the minimax function
-    # Similar logic as check_winner but tailored for minimax
-    
-    def check_winner_minimax(self):
-        
-        # Check rows
-        for i in range(3):
-            if self.buttons[i][0]["text"] == self.buttons[i][1]["text"] == self.buttons[i][2]["text"] != "":
-                return self.buttons[i][0]["text"]
-        # Check columns
-        for i in range(3):
-            if self.buttons[0][i]["text"] == self.buttons[1][i]["text"] == self.buttons[2][i]["text"] != "":
-                return self.buttons[0][i]["text"]
-        # Check diagonals
-        if self.buttons[0][0]["text"] == self.buttons[1][1]["text"] == self.buttons[2][2]["text"] != "":
-            return self.buttons[0][0]["text"]
-        if self.buttons[0][2]["text"] == self.buttons[1][1]["text"] == self.buttons[2][0]["text"] != "":
-            return self.buttons[0][2]["text"]
-        # Check for draw
-        if all(self.buttons[i][j]["text"] != "" for i in range(3) for j in range(3)):
-            return 'Draw'
-        return None
+    def best_move(self, position, stop=None):
+        time_budget = AI_TIME_BUDGET if position.size > 3 else None
+        square = self.engine.best_move(position, time_budget, stop)
+        if square is None:
+            return None
+        return divmod(square, position.size)
 
 
 # Main function to run the application